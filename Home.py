@@ -1,5 +1,4 @@
 import streamlit as st
-import sqlite3
 from passlib.hash import bcrypt
 from PIL import Image
 import os
@@ -10,6 +9,8 @@ import matplotlib.pyplot as plt
 
 
 from pages import *
+from db_utils import DB_PATH, get_connection
+from schema_utils import ensure_schema
 
 
 # Settings
@@ -18,52 +19,18 @@ from pages import *
 def initiate_sessions():
     # Initiate session states
     if 'main_database' not in st.session_state:
-        st.session_state.main_database = os.path.join(os.getcwd(), "db.sqlite")
-
-    # =============================================================================#
-
-    conn = sqlite3.connect(st.session_state.main_database)
-    cursor = conn.cursor()
-
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS users (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            username TEXT NOT NULL,
-            password TEXT NOT NULL
-        )
-    ''')
-
-    cursor.execute('''
-        CREATE TABLE IF NOT EXISTS worksorders (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            projectNumber TEXT UNIQUE NOT NULL,
-            customerCompanyName TEXT NOT NULL,
-            projectName TEXT NOT NULL,
-            projectDirectory TEXT NOT NULL,
-            status TEXT
-        )
-    ''')
-
-    cursor.execute('''
-            CREATE TABLE IF NOT EXISTS resources (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                firstName TEXT NOT NULL,
-                lastName TEXT NOT NULL,
-                birthday TEXT NOT NULL
-            )
-        ''')
-
-    conn.commit()
-    conn.close()
+        st.session_state.main_database = DB_PATH
+
+    # Apply pending schema migrations (runs once per server process)
+    ensure_schema()
 
 
 # Function to validate user credentials
 def validate_user(username, password):
-    conn = sqlite3.connect(st.session_state.main_database)
-    cursor = conn.cursor()
-    cursor.execute('SELECT password FROM users WHERE username = ?', (username,))
-    row = cursor.fetchone()
-    conn.close()
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute('SELECT password FROM users WHERE username = ?', (username,))
+        row = cursor.fetchone()
 
     if row and bcrypt.verify(password, row[0]):
         return True
@@ -0,0 +1,94 @@
+import numpy as np
+
+
+# =============================================================================#
+# Fan affinity laws
+# For the same fan at a speed ratio r = N2 / N1:
+#   Q2 = r * Q1        P2 = r**2 * P1
+# so a fitted curve P1(Q) becomes P2(Q) = r**2 * P1(Q / r). Fits are
+# polynomials in the flow normalised to their fitted range, and that range
+# scales by r too, so the normalised flow of Q on the new curve equals that of
+# Q / r on the old one: every coefficient simply scales by r**2. A single
+# reference curve can be evaluated at any speed without refitting.
+
+# Bisection steps when solving for the speed that meets a duty point
+SPEED_SOLVE_ITERATIONS = 48
+
+# Rated speeds (rpm) of 8-, 6-, 4- and 2-pole motors on a 50 Hz supply: the
+# speeds a direct-drive fan runs at, offered as fixed and overlay speeds
+MOTOR_SPEEDS = (720, 960, 1440, 2880)
+
+
+def parse_speed(speed):
+    """Convert a stored speed such as "1440" or "1440rpm" to a float, or NaN."""
+    try:
+        return float(str(speed).lower().replace("rpm", "").strip())
+    except ValueError:
+        return np.nan
+
+
+def scale_coefficients(coefficients, ratios):
+    """Scale fit coefficients to new speed ratios; the flow range scales by the ratio alongside.
+
+    ``coefficients`` is ``(terms,)`` or ``(curves, terms)`` and ``ratios`` is
+    broadcast against the curves, e.g. ``(curves,)`` for one ratio per curve
+    or ``(curves, speeds)`` for many speeds per curve. The result has the
+    ratio shape with a trailing terms axis.
+    """
+    coefficients = np.asarray(coefficients, dtype=float)
+    ratios = np.asarray(ratios, dtype=float)
+    if coefficients.ndim == 2:
+        coefficients = coefficients.reshape(coefficients.shape[:1] + (1,) * (ratios.ndim - 1) + coefficients.shape[1:])
+    return coefficients * ratios[..., None] ** 2
+
+
+def scale_fit_index(index, ratios):
+    """Return a copy of the fit index arrays with every curve moved to its speed ratio."""
+    ratios = np.asarray(ratios, dtype=float)
+    scaled = dict(index)
+    scaled["coefficients"] = scale_coefficients(index["coefficients"], ratios)
+    scaled["flow_min"] = index["flow_min"] * ratios
+    scaled["flow_max"] = index["flow_max"] * ratios
+    scaled["pressure_min"] = index["pressure_min"] * ratios ** 2
+    scaled["pressure_max"] = index["pressure_max"] * ratios ** 2
+    return scaled
+
+
+def solve_speed_ratios(coefficients, flow_min, flow_max, flow_rate, pressure, ratio_min, ratio_max):
+    """Find the speed ratio at which each curve passes through a duty point.
+
+    Solves ``r**2 * P(flow_rate / r) = pressure`` by vectorised bisection over
+    all curves at once. The search for each curve is limited to ratios that
+    keep ``flow_rate / r`` inside its fitted flow range. Returns NaN where
+    no ratio in range reaches the duty point.
+    """
+    # Keep Q / r inside [flow_min, flow_max]
+    with np.errstate(divide="ignore"):
+        low = np.maximum(ratio_min, flow_rate / flow_max)
+        high = np.minimum(ratio_max, np.where(flow_min > 0, flow_rate / flow_min, np.inf))
+
+    centre = (flow_max + flow_min) / 2
+    half_width = np.where(flow_max > flow_min, (flow_max - flow_min) / 2, 1.0)
+
+    def excess(ratios):
+        unit_flow = (flow_rate / ratios - centre) / half_width
+        result = np.zeros_like(ratios)
+        for term in range(coefficients.shape[1]):
+            result = result * unit_flow + coefficients[:, term]
+        return ratios ** 2 * result - pressure
+
+    valid = low <= high
+    low = np.where(valid, low, 1.0)
+    high = np.where(valid, high, 1.0)
+    excess_low = excess(low)
+    valid &= np.sign(excess_low) != np.sign(excess(high))
+
+    for _ in range(SPEED_SOLVE_ITERATIONS):
+        mid = (low + high) / 2
+        excess_mid = excess(mid)
+        same_side = np.sign(excess_mid) == np.sign(excess_low)
+        low = np.where(same_side, mid, low)
+        excess_low = np.where(same_side, excess_mid, excess_low)
+        high = np.where(same_side, high, mid)
+
+    return np.where(valid, (low + high) / 2, np.nan)
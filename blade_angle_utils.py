@@ -0,0 +1,208 @@
+import threading
+
+import numpy as np
+import streamlit as st
+
+from affinity_utils import parse_speed
+from fit_utils import load_fit_index, sample_fit_index
+
+
+# Flow samples across a group's combined flow range
+FLOW_GRID_POINTS = 200
+
+# Angle step, in degrees, used when solving for the blade angle that meets a duty point
+ANGLE_STEP = 0.25
+
+
+# =============================================================================#
+# Blade-angle performance surfaces
+# Models sharing a model_number_group and speed differ only by blade angle.
+# Their fitted curves are sampled on a common flow grid to form a surface of
+# pressure over (blade angle, flow), so intermediate angles can be evaluated
+# by interpolation. A brand or drive-train filter drops models from the
+# surface itself, so a filtered search never interpolates through an angle
+# the filter excludes. Surfaces are cached per (group, speed, brand,
+# drive train); each row remembers the coefficients it was sampled from, so
+# saving one angle's curve only resamples that row.
+
+def parse_angle(blade_angle):
+    """Convert a stored blade angle such as "25°" to a float, or NaN."""
+    try:
+        return float(str(blade_angle).replace("°", "").strip())
+    except ValueError:
+        return np.nan
+
+
+@st.cache_resource(show_spinner=False)
+def _surface_store():
+    """Process-wide cache of built surfaces, shared by every session."""
+    return {"surfaces": {}, "groups": None, "groups_of": None, "lock": threading.Lock()}
+
+
+def _group_positions(index):
+    """Map each (model group, speed) to its fit index positions, sorted by blade angle.
+
+    Computed once per fit index and kept until the index is reloaded.
+    """
+    store = _surface_store()
+    if store["groups_of"] is not index:
+        angles = np.array([parse_angle(angle) for angle in index["blade_angle"]], dtype=float)
+        groups = {}
+        for position, key in enumerate(zip(index["model_number_group"], index["speed"])):
+            if not np.isnan(angles[position]):
+                groups.setdefault(key, []).append(position)
+        for key, positions in groups.items():
+            positions = np.array(positions)
+            order = np.argsort(angles[positions], kind="stable")
+            groups[key] = (positions[order], angles[positions][order])
+        store["groups"], store["groups_of"] = groups, index
+    return store["groups"]
+
+
+def _surface_positions(index, group, speed, brand=None, drive_train=None):
+    """Return the fit index positions and blade angles of a group at one speed, limited to a brand and drive train."""
+    positions, angles = _group_positions(index).get((group, speed), (np.array([], dtype=int), np.array([])))
+    keep = np.ones(len(positions), dtype=bool)
+    if brand:
+        keep &= index["brand"][positions] == brand
+    if drive_train:
+        keep &= index["drive_train"][positions] == drive_train
+    return positions[keep], angles[keep]
+
+
+def build_surface(group, speed, brand=None, drive_train=None):
+    """Build or incrementally refresh the surface for a model group at one speed, or None.
+
+    Only models of ``brand`` and ``drive_train``, when given, are part of the surface.
+    """
+    index = load_fit_index()
+    store = _surface_store()
+    key = (group, speed, brand, drive_train)
+    cached = store["surfaces"].get(key)
+    if cached is not None and cached["built_from"] is index:
+        return cached
+
+    positions, angles = _surface_positions(index, group, speed, brand, drive_train)
+    if not len(positions):
+        return None
+
+    fan_ids = index["fan_id"][positions]
+    signatures = [
+        index["coefficients"][i].tobytes() + index["flow_min"][i].tobytes() + index["flow_max"][i].tobytes()
+        for i in positions
+    ]
+    flow_low, flow_high = index["flow_min"][positions].min(), index["flow_max"][positions].max()
+
+    with store["lock"]:
+        if cached is not None and cached["flow_grid"][0] <= flow_low and cached["flow_grid"][-1] >= flow_high:
+            # Reuse every row whose fit is unchanged; resample only new or edited angles
+            flow_grid = cached["flow_grid"]
+            previous = dict(zip(cached["fan_ids"], zip(cached["signatures"], cached["pressure"])))
+            pressure = np.empty((len(positions), len(flow_grid)))
+            stale = []
+            for row, (fan_id, signature) in enumerate(zip(fan_ids, signatures)):
+                if fan_id in previous and previous[fan_id][0] == signature:
+                    pressure[row] = previous[fan_id][1]
+                else:
+                    stale.append(row)
+            if stale:
+                pressure[stale] = sample_fit_index(index, positions[stale], flow_grid)
+        else:
+            flow_grid = np.linspace(flow_low, flow_high, FLOW_GRID_POINTS)
+            pressure = sample_fit_index(index, positions, flow_grid)
+
+        surface = {
+            "group": group,
+            "speed": speed,
+            "brand": brand,
+            "drive_train": drive_train,
+            "fan_ids": fan_ids,
+            "signatures": signatures,
+            "angles": angles,
+            "flow_grid": flow_grid,
+            "pressure": pressure,
+            "built_from": index,
+        }
+        store["surfaces"][key] = surface
+    return surface
+
+
+def evaluate_surface(surface, flow_rates, angles):
+    """Interpolate pressure at any (flow, blade angle) pairs on a surface.
+
+    ``flow_rates`` and ``angles`` broadcast against each other. Pressure is
+    linear in flow between grid samples and linear in angle between the
+    stored blade angles; points outside the surface are NaN.
+    """
+    flow_rates, angles = np.broadcast_arrays(np.asarray(flow_rates, dtype=float), np.asarray(angles, dtype=float))
+    flow_grid, stored_angles, pressure = surface["flow_grid"], surface["angles"], surface["pressure"]
+
+    # Position along the flow grid
+    flow_pos = np.interp(flow_rates, flow_grid, np.arange(len(flow_grid)))
+    flow_lo = np.clip(np.floor(flow_pos).astype(int), 0, max(len(flow_grid) - 2, 0))
+    flow_hi = np.minimum(flow_lo + 1, len(flow_grid) - 1)
+    flow_frac = flow_pos - flow_lo
+
+    # Position between stored blade angles; a single angle has no width to interpolate over
+    if len(stored_angles) == 1:
+        angle_lo = angle_hi = np.zeros(angles.shape, dtype=int)
+        angle_frac = np.zeros(angles.shape)
+    else:
+        angle_pos = np.interp(angles, stored_angles, np.arange(len(stored_angles)))
+        angle_lo = np.clip(np.floor(angle_pos).astype(int), 0, len(stored_angles) - 2)
+        angle_hi = angle_lo + 1
+        angle_frac = angle_pos - angle_lo
+
+    def at_angle(angle_row):
+        return pressure[angle_row, flow_lo] * (1 - flow_frac) + pressure[angle_row, flow_hi] * flow_frac
+
+    result = at_angle(angle_lo) * (1 - angle_frac) + at_angle(angle_hi) * angle_frac
+    outside = (
+        (flow_rates < flow_grid[0]) | (flow_rates > flow_grid[-1])
+        | (angles < stored_angles[0]) | (angles > stored_angles[-1])
+    )
+    result[outside] = np.nan
+    return result
+
+
+def get_surface_keys(brand=None, drive_train=None):
+    """Return every (model group, speed) pair with at least two fitted blade angles of a brand and drive train."""
+    index = load_fit_index()
+    return [
+        (group, speed) for group, speed in _group_positions(index)
+        if len(_surface_positions(index, group, speed, brand, drive_train)[0]) > 1
+    ]
+
+
+def select_blade_angles(flow_rate, pressure, brand=None, drive_train=None, speed=None):
+    """Find, for every model group, the blade angle at which it meets a duty point.
+
+    Each surface is evaluated at the duty flow over a fine angle grid in one
+    vectorised call, and the first crossing of the duty pressure is
+    interpolated. When ``speed`` (rpm) is given the duty point is moved to
+    each group's tested speed with the fan affinity laws, so the angle is the
+    one that meets it at ``speed``; groups without a numeric speed are
+    skipped. Returns one result per group that can reach the duty point,
+    lowest angle first.
+    """
+    results = []
+    for group, group_speed in get_surface_keys(brand, drive_train):
+        # Flow scales with the speed ratio r and pressure with r**2
+        ratio = speed / parse_speed(group_speed) if speed else 1.0
+        if np.isnan(ratio):
+            continue
+        surface = build_surface(group, group_speed, brand, drive_train)
+        angles = np.arange(surface["angles"][0], surface["angles"][-1] + ANGLE_STEP / 2, ANGLE_STEP)
+        excess = evaluate_surface(surface, flow_rate / ratio, angles) - pressure / ratio ** 2
+
+        crossings = np.flatnonzero((excess[:-1] < 0) & (excess[1:] >= 0))
+        if excess[0] >= 0:
+            angle = angles[0]
+        elif len(crossings):
+            i = crossings[0]
+            angle = angles[i] + ANGLE_STEP * -excess[i] / (excess[i + 1] - excess[i])
+        else:
+            continue
+        results.append({"model_number_group": group, "speed": speed or group_speed, "blade_angle": float(angle)})
+
+    return sorted(results, key=lambda result: result["blade_angle"])
@@ -0,0 +1,166 @@
+import sqlite3
+import streamlit as st
+
+from db_utils import bump_catalog_version, get_catalog_versions, get_connection
+from fit_utils import invalidate_fit_index
+
+
+# =============================================================================#
+# Cached catalog
+# Brands and models are loaded once into process-wide caches shared by every
+# session and indexed for O(1) lookups. Each cache is keyed by its table's
+# write counter in catalog_version, which every write transaction bumps with
+# bump_catalog_version, so a write from another process (the CLI importer, a
+# second server) is picked up on the next read. A read with no writes costs
+# one counter query. Writes below also clear the index they change.
+
+@st.cache_resource(show_spinner=False, max_entries=1)
+def _load_brand_catalog(version):
+    """Load every brand and index it by id and by name; ``version`` is the brands write counter."""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT id, name FROM brands ORDER BY id")
+        items = [{"id": row[0], "name": row[1]} for row in cursor.fetchall()]
+    return {
+        "items": items,
+        "by_id": {brand["id"]: brand for brand in items},
+        "by_name": {brand["name"]: brand for brand in items},
+    }
+
+
+@st.cache_resource(show_spinner=False, max_entries=1)
+def _load_model_catalog(version):
+    """Load every fan model and index it by model number; ``version`` is the fan_data write counter."""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT id, model_number, model_number_group, brand, speed, blade_angle, drive_train
+            FROM fan_data ORDER BY id
+        """)
+        items = [
+            {
+                "id": row[0],
+                "model_number": row[1],
+                "model_number_group": row[2],
+                "brand": row[3],
+                "speed": row[4],
+                "blade_angle": row[5],
+                "drive_train": row[6],
+            }
+            for row in cursor.fetchall()
+        ]
+    return {
+        "items": items,
+        "by_number": {model["model_number"]: model for model in items},
+    }
+
+
+def _brand_catalog():
+    """Return the brand index, reloading it if the brands table changed since it was loaded."""
+    return _load_brand_catalog(get_catalog_versions()["brands"])
+
+
+def _model_catalog():
+    """Return the model index, reloading it if the fan_data table changed since it was loaded."""
+    return _load_model_catalog(get_catalog_versions()["fan_data"])
+
+
+def invalidate_brands():
+    """Drop the cached brand index so the next read reloads it."""
+    _load_brand_catalog.clear()
+
+
+def invalidate_models():
+    """Drop the cached model index so the next read reloads it."""
+    _load_model_catalog.clear()
+    # The fit index carries model attributes used as search filters
+    invalidate_fit_index()
+
+
+# =============================================================================#
+# Brands
+
+def get_brands():
+    """Fetch all brands as ``{"id", "name"}`` dicts."""
+    return _brand_catalog()["items"]
+
+
+def get_brand_by_name(name):
+    """Look up a brand by name, or None."""
+    return _brand_catalog()["by_name"].get(name)
+
+
+def add_brand(brand_name):
+    """Add a new brand; returns False if the name already exists."""
+    try:
+        with get_connection(write=True) as conn:
+            conn.execute("INSERT INTO brands (name) VALUES (?)", (brand_name,))
+            bump_catalog_version(conn, "brands")
+    except sqlite3.IntegrityError:
+        return False
+    invalidate_brands()
+    return True
+
+
+def edit_brand(brand_id, new_name):
+    """Rename a brand; returns False if the new name already exists."""
+    try:
+        with get_connection(write=True) as conn:
+            conn.execute("UPDATE brands SET name = ? WHERE id = ?", (new_name, brand_id))
+            bump_catalog_version(conn, "brands")
+    except sqlite3.IntegrityError:
+        return False
+    invalidate_brands()
+    return True
+
+
+def delete_brand(brand_id):
+    """Delete a brand from the database."""
+    with get_connection(write=True) as conn:
+        conn.execute("DELETE FROM brands WHERE id = ?", (brand_id,))
+        bump_catalog_version(conn, "brands")
+    invalidate_brands()
+
+
+# =============================================================================#
+# Fan models
+
+def get_saved_models():
+    """Fetch all saved models, each with its full fan_data details."""
+    return _model_catalog()["items"]
+
+
+def get_model_by_number(model_number):
+    """Look up a model by model number, or None."""
+    return _model_catalog()["by_number"].get(model_number)
+
+
+def save_fan_data(model_number, model_number_group, brand, speed, blade_angle, drive_train):
+    """Save a new fan model; returns False if the model number already exists."""
+    try:
+        with get_connection(write=True) as conn:
+            conn.execute("""
+                INSERT INTO fan_data (model_number, model_number_group, brand, speed, blade_angle, drive_train)
+                VALUES (?, ?, ?, ?, ?, ?)
+            """, (model_number, model_number_group, brand, speed, blade_angle, drive_train))
+            bump_catalog_version(conn, "fan_data")
+    except sqlite3.IntegrityError:
+        return False
+    invalidate_models()
+    return True
+
+
+def update_fan_data(model_id, model_number, model_number_group, brand, speed, blade_angle, drive_train):
+    """Update an existing fan model; returns False if the model number clashes with another model."""
+    try:
+        with get_connection(write=True) as conn:
+            conn.execute("""
+                UPDATE fan_data
+                SET model_number = ?, model_number_group = ?, brand = ?, speed = ?, blade_angle = ?, drive_train = ?
+                WHERE id = ?
+            """, (model_number, model_number_group, brand, speed, blade_angle, drive_train, model_id))
+            bump_catalog_version(conn, "fan_data")
+    except sqlite3.IntegrityError:
+        return False
+    invalidate_models()
+    return True
@@ -0,0 +1,100 @@
+import threading
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from curve_utils import load_curves
+from fit_utils import load_fit_index, sample_fit_index
+
+
+# Comparisons kept in memory; older ones are dropped first
+COMPARISON_CACHE_SIZE = 32
+
+
+# =============================================================================#
+# Curve comparison
+# Fitted polynomials come from the in-memory fit index, so overlaying N curves
+# is one vectorised evaluation on a shared flow grid. Measured points are read
+# with a single batched query. Results are cached per selection until the fit
+# index is reloaded, which happens whenever a curve or model is saved.
+
+@st.cache_resource(show_spinner=False)
+def _comparison_store():
+    """Process-wide cache of built comparisons, shared by every session."""
+    return {"comparisons": OrderedDict(), "built_from": None, "lock": threading.Lock()}
+
+
+def find_fan_ids(model_numbers=None, model_number_group=None, brand=None):
+    """Return the ids of fitted models matching a list of model numbers, a model group or a brand."""
+    index = load_fit_index()
+    mask = np.ones(len(index["fan_id"]), dtype=bool)
+    if model_numbers is not None:
+        mask &= np.isin(index["model_number"], list(model_numbers))
+    if model_number_group:
+        mask &= index["model_number_group"] == model_number_group
+    if brand:
+        mask &= index["brand"] == brand
+    return [int(fan_id) for fan_id in index["fan_id"][mask]]
+
+
+def compare_curves(fan_ids, samples, include_points=False):
+    """Evaluate the fitted curves of several models on one shared flow grid.
+
+    Returns a dict with the models' ``positions`` in the fit index, their
+    ``labels``, the ``flow_grid`` spanning every fitted range and a
+    ``pressure`` matrix with one row per model (NaN outside each model's
+    fitted range). With ``include_points`` the measured ``points`` are added
+    as ``{fan_id: (flow_rates, pressures)}``.
+    """
+    index = load_fit_index()
+    key = (tuple(sorted(fan_ids)), samples, include_points)
+    store = _comparison_store()
+    with store["lock"]:
+        if store["built_from"] is not index:
+            store["comparisons"].clear()
+            store["built_from"] = index
+        cached = store["comparisons"].get(key)
+        if cached is not None:
+            store["comparisons"].move_to_end(key)
+            return cached
+
+    positions = np.flatnonzero(np.isin(index["fan_id"], key[0]))
+    if len(positions):
+        flow_grid = np.linspace(index["flow_min"][positions].min(), index["flow_max"][positions].max(), samples)
+        pressure = sample_fit_index(index, positions, flow_grid)
+    else:
+        flow_grid, pressure = np.array([]), np.empty((0, 0))
+
+    comparison = {
+        "fan_ids": index["fan_id"][positions],
+        "positions": positions,
+        "labels": list(index["model_number"][positions]),
+        "flow_grid": flow_grid,
+        "pressure": pressure,
+        "points": load_curves(index["fan_id"][positions].tolist()) if include_points else {},
+    }
+
+    with store["lock"]:
+        if store["built_from"] is index:
+            store["comparisons"][key] = comparison
+            while len(store["comparisons"]) > COMPARISON_CACHE_SIZE:
+                store["comparisons"].popitem(last=False)
+    return comparison
+
+
+def comparison_summary(comparison):
+    """Tabulate the model attributes and fitted ranges of a comparison."""
+    index = load_fit_index()
+    positions = comparison["positions"]
+    return pd.DataFrame({
+        "Model Number": index["model_number"][positions],
+        "Brand": index["brand"][positions],
+        "Model Group": index["model_number_group"][positions],
+        "Speed": index["speed"][positions],
+        "Blade Angle": index["blade_angle"][positions],
+        "Min Flow (m³/s)": index["flow_min"][positions],
+        "Max Flow (m³/s)": index["flow_max"][positions],
+        "Max Pressure (Pa)": index["pressure_max"][positions],
+    })
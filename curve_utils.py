@@ -0,0 +1,241 @@
+import hashlib
+import struct
+
+import numpy as np
+import pandas as pd
+
+from db_utils import get_connection
+from image_utils import collect_garbage, store_image
+
+
+# =============================================================================#
+# Curve point storage format
+# A curve is stored as one BLOB: a fixed header followed by the packed
+# flow_rate array and then the packed pressure array.
+#
+#   magic    4 bytes  b"FCRV"
+#   version  uint8    CURVE_FORMAT_VERSION
+#   dtype    uint8    key of CURVE_DTYPES
+#   padding  2 bytes
+#   points   uint32   number of points per column
+#
+# Loading is a zero-copy np.frombuffer over the BLOB.
+
+CURVE_MAGIC = b"FCRV"
+CURVE_FORMAT_VERSION = 1
+CURVE_DTYPES = {1: np.dtype("<f8"), 2: np.dtype("<f4")}
+CURVE_HEADER = struct.Struct("<4sBBxxI")
+
+
+def pack_curve(flow_rates, pressures, dtype=np.float64):
+    """Pack flow rate and pressure columns into a curve BLOB."""
+    dtype = np.dtype(dtype).newbyteorder("<")
+    dtype_code = next((code for code, known in CURVE_DTYPES.items() if known == dtype), None)
+    if dtype_code is None:
+        raise ValueError(f"Unsupported curve dtype: {dtype}")
+
+    flow_rates = np.ascontiguousarray(flow_rates, dtype=dtype)
+    pressures = np.ascontiguousarray(pressures, dtype=dtype)
+    if flow_rates.shape != pressures.shape or flow_rates.ndim != 1:
+        raise ValueError("Flow rates and pressures must be 1-D arrays of equal length")
+
+    header = CURVE_HEADER.pack(CURVE_MAGIC, CURVE_FORMAT_VERSION, dtype_code, len(flow_rates))
+    return header + flow_rates.tobytes() + pressures.tobytes()
+
+
+def unpack_curve(blob):
+    """Return read-only ``(flow_rates, pressures)`` views over a curve BLOB."""
+    magic, version, dtype_code, points = CURVE_HEADER.unpack_from(blob)
+    if magic != CURVE_MAGIC:
+        raise ValueError("Not a packed curve")
+    if version != CURVE_FORMAT_VERSION:
+        raise ValueError(f"Unsupported curve format version: {version}")
+
+    dtype = CURVE_DTYPES[dtype_code]
+    flow_rates = np.frombuffer(blob, dtype=dtype, count=points, offset=CURVE_HEADER.size)
+    pressures = np.frombuffer(blob, dtype=dtype, count=points, offset=CURVE_HEADER.size + points * dtype.itemsize)
+    return flow_rates, pressures
+
+
+def curve_digest(flow_rates, pressures):
+    """Hash a curve's points as float64, so a fit can be matched to the data it came from."""
+    return hashlib.sha256(pack_curve(flow_rates, pressures)).hexdigest()
+
+
+def records_to_curve(records):
+    """Convert legacy ``[{"flow_rate": ..., "pressure": ...}]`` records to a curve BLOB."""
+    flow_rates = [np.nan if row.get("flow_rate") is None else row["flow_rate"] for row in records]
+    pressures = [np.nan if row.get("pressure") is None else row["pressure"] for row in records]
+    return pack_curve(flow_rates, pressures)
+
+
+# =============================================================================#
+# Point entry buffer
+# Points typed or pasted on the performance page are appended to preallocated
+# column arrays that grow by doubling, so adding a point is amortised O(1).
+# A DataFrame is only built when something needs one, and is reused until the
+# buffer changes.
+
+class PointBuffer:
+    """Growable columnar buffer of (flow_rate, pressure) points."""
+
+    INITIAL_CAPACITY = 64
+
+    def __init__(self, flow_rates=(), pressures=()):
+        self.size = 0
+        self.version = 0
+        self._flow_rates = np.empty(self.INITIAL_CAPACITY)
+        self._pressures = np.empty(self.INITIAL_CAPACITY)
+        self._frame = None
+        self.extend(flow_rates, pressures)
+
+    def __len__(self):
+        return self.size
+
+    def _reserve(self, size):
+        if size > len(self._flow_rates):
+            capacity = max(size, 2 * len(self._flow_rates))
+            self._flow_rates = np.resize(self._flow_rates, capacity)
+            self._pressures = np.resize(self._pressures, capacity)
+
+    def _changed(self):
+        self.version += 1
+        self._frame = None
+
+    def append(self, flow_rate, pressure):
+        self.extend([flow_rate], [pressure])
+
+    def extend(self, flow_rates, pressures):
+        flow_rates = np.asarray(flow_rates, dtype=float)
+        pressures = np.asarray(pressures, dtype=float)
+        if flow_rates.shape != pressures.shape:
+            raise ValueError("Flow rates and pressures must have the same length")
+        end = self.size + len(flow_rates)
+        self._reserve(end)
+        self._flow_rates[self.size:end] = flow_rates
+        self._pressures[self.size:end] = pressures
+        self.size = end
+        self._changed()
+
+    def replace(self, flow_rates, pressures):
+        """Replace every point, e.g. with the contents of an edited table."""
+        self.size = 0
+        self.extend(flow_rates, pressures)
+
+    def arrays(self):
+        """Return ``(flow_rates, pressures)`` views of the buffered points."""
+        return self._flow_rates[:self.size], self._pressures[:self.size]
+
+    def to_frame(self):
+        """Return the points as a flow_rate/pressure DataFrame, built once per change."""
+        if self._frame is None:
+            flow_rates, pressures = self.arrays()
+            self._frame = pd.DataFrame({"flow_rate": flow_rates.copy(), "pressure": pressures.copy()})
+        return self._frame
+
+
+def parse_points(text):
+    """Parse pasted points, one "flow_rate pressure" pair per line.
+
+    Values may be separated by commas, tabs, semicolons or spaces, as copied
+    from a spreadsheet. Blank lines are skipped. Returns ``(flow_rates,
+    pressures)``; raises ValueError naming the first line that is not two numbers.
+    """
+    flow_rates, pressures = [], []
+    for number, line in enumerate(text.splitlines(), start=1):
+        values = line.replace(",", " ").replace(";", " ").split()
+        if not values:
+            continue
+        try:
+            flow_rate, pressure = (float(value) for value in values)
+        except ValueError:
+            raise ValueError(f"Line {number} is not a flow rate and pressure pair: {line.strip()}") from None
+        flow_rates.append(flow_rate)
+        pressures.append(pressure)
+    return np.array(flow_rates), np.array(pressures)
+
+
+# =============================================================================#
+# Performance data access
+
+def load_curve(fan_id):
+    """Fetch the stored curve for a fan model as ``(flow_rates, pressures)``, or None."""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT curve_points FROM performance_data WHERE fan_id = ?", (fan_id,))
+        row = cursor.fetchone()
+    if row and row[0] is not None:
+        return unpack_curve(row[0])
+    return None
+
+
+def load_all_curves():
+    """Fetch every stored curve as ``{fan_id: (flow_rates, pressures)}`` in one query."""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT fan_id, curve_points FROM performance_data WHERE curve_points IS NOT NULL")
+        return {fan_id: unpack_curve(blob) for fan_id, blob in cursor}
+
+
+def load_curves(fan_ids):
+    """Fetch the stored curves of selected models as ``{fan_id: (flow_rates, pressures)}`` in one query."""
+    fan_ids = list(fan_ids)
+    if not fan_ids:
+        return {}
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(f"""
+            SELECT fan_id, curve_points FROM performance_data
+            WHERE curve_points IS NOT NULL AND fan_id IN ({', '.join('?' * len(fan_ids))})
+        """, fan_ids)
+        return {fan_id: unpack_curve(blob) for fan_id, blob in cursor}
+
+
+def save_performance_data(fan_id, flow_rates, pressures, curve_image=None, polynomial_function=None, conn=None):
+    """Save performance data, curve image, and polynomial function into the database.
+
+    The curve image is written to the image store and only its digest is kept
+    in performance_data. The image it replaces is deleted once no row
+    references it and it is past the collection grace period.
+
+    Pass a write connection as ``conn`` to save within the caller's
+    transaction, e.g. together with the curve's fit. The replaced image's
+    digest is then returned instead, for the caller to collect after it
+    commits.
+    """
+    # Pack and store the image outside the transaction so the write lock is held only for the row write
+    curve_points = pack_curve(flow_rates, pressures)
+    curve_image_digest = store_image(curve_image) if curve_image else None
+    if conn is not None:
+        return _write_performance_row(conn, fan_id, curve_points, curve_image_digest, polynomial_function)
+
+    with get_connection(write=True) as conn:
+        replaced = _write_performance_row(conn, fan_id, curve_points, curve_image_digest, polynomial_function)
+    if replaced:
+        collect_garbage([replaced])
+
+
+def _write_performance_row(conn, fan_id, curve_points, curve_image_digest, polynomial_function):
+    """Insert or update a model's performance_data row; returns the image digest it replaced, or None."""
+    cursor = conn.cursor()
+
+    # Check if performance data already exists for the fan
+    cursor.execute("SELECT curve_image_digest FROM performance_data WHERE fan_id = ?", (fan_id,))
+    existing = cursor.fetchone()
+
+    if existing:
+        # Update existing data
+        cursor.execute("""
+            UPDATE performance_data
+            SET curve_points = ?, curve_image_digest = ?, polynomial_function = ?
+            WHERE fan_id = ?
+        """, (curve_points, curve_image_digest, polynomial_function, fan_id))
+    else:
+        # Insert new data
+        cursor.execute("""
+            INSERT INTO performance_data (fan_id, curve_points, curve_image_digest, polynomial_function)
+            VALUES (?, ?, ?, ?)
+        """, (fan_id, curve_points, curve_image_digest, polynomial_function))
+
+    replaced = existing[0] if existing else None
+    return replaced if replaced != curve_image_digest else None
@@ -0,0 +1 @@
+"""Command-line entry point for the fan data tools: ``python -m data_capture``."""
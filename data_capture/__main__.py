@@ -0,0 +1,157 @@
+import argparse
+import json
+import sys
+
+import pandas as pd
+
+from db_utils import DB_PATH, set_db_path
+from export_utils import export_catalog
+from fit_utils import refit_catalog
+from image_utils import GC_GRACE_SECONDS, collect_garbage
+from import_utils import CHUNK_ROWS, import_catalog
+from report_utils import generate_reports, load_report_spec
+from schema_utils import ensure_schema
+from selection_utils import MAX_OVERSIZE, PRESSURE_TOLERANCE, select_fans, select_speed_fans
+
+
+# =============================================================================#
+# Commands
+# Each command works on the same data-access functions as the Streamlit pages
+# and returns the process exit code.
+
+def run_import(args):
+    summary = import_catalog(args.path, degree=args.degree, chunk_rows=args.chunk_rows)
+    for error in summary["errors"]:
+        line = f"line {error['line']}" if error["line"] else "model"
+        print(f"{line}: {error['model_number']}: {error['error']}", file=sys.stderr)
+    print(f"Imported {summary['points']} points for {summary['models']} models "
+          f"from {summary['rows']} rows ({len(summary['errors'])} errors)")
+    return 1 if summary["errors"] else 0
+
+
+def run_export(args):
+    count, unit = export_catalog(args.path)
+    print(f"Exported {count} {unit} to {args.path}")
+    return 0
+
+
+def run_refit(args):
+    fits = refit_catalog(args.degree, automatic=args.auto_degree, stale_only=args.stale)
+    print(f"Refitted {len(fits)} curves")
+    return 0
+
+
+def run_select(args):
+    if args.speed_range:
+        results = select_speed_fans(
+            args.flow, args.pressure, *args.speed_range, brand=args.brand, drive_train=args.drive_train,
+            limit=args.limit,
+        )
+    else:
+        results = select_fans(
+            args.flow, args.pressure, pressure_tolerance=args.pressure_tolerance, max_oversize=args.max_oversize,
+            flow_tolerance=args.flow_tolerance, brand=args.brand, drive_train=args.drive_train, speed=args.speed,
+            limit=args.limit,
+        )
+
+    if args.format == "json":
+        print(json.dumps(results, indent=2))
+    elif args.format == "csv":
+        pd.DataFrame(results).to_csv(sys.stdout, index=False)
+    elif results:
+        print(pd.DataFrame(results).to_string(index=False))
+    else:
+        print("No fan meets the duty point.")
+    return 0
+
+
+def run_report(args):
+    specs = [load_report_spec(spec_path) for spec_path in args.specs]
+    results = generate_reports(
+        specs, args.output, args.jobs, use_cache=not args.no_cache, use_format=not args.no_format
+    )
+    for spec_path, result in zip(args.specs, results):
+        if result["pdf_path"]:
+            print(result["pdf_path"])
+        else:
+            print(f"{spec_path}: {result['error']}", file=sys.stderr)
+    return 1 if any(result["error"] for result in results) else 0
+
+
+def run_gc_images(args):
+    removed = collect_garbage(grace_seconds=args.grace)
+    print(f"Removed {removed} unreferenced images")
+    return 0
+
+
+# =============================================================================#
+# Argument parsing
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="data_capture", description="Fan catalog tools without the web app.")
+    parser.add_argument("--db", default=DB_PATH, help="SQLite database file (default: %(default)s)")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    command = commands.add_parser("import", help="import brands, models and curve points from CSV, Excel or Parquet")
+    command.add_argument("path")
+    command.add_argument("--degree", type=int,
+                         help="fit every imported curve with this degree (default: keep stored degrees and "
+                              "choose new ones by cross-validation)")
+    command.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS, help="rows validated at a time")
+    command.set_defaults(run=run_import)
+
+    command = commands.add_parser("export", help="export the catalog as CSV, or Parquet for a .parquet path")
+    command.add_argument("path")
+    command.set_defaults(run=run_export)
+
+    command = commands.add_parser("refit", help="refit every stored curve")
+    degree = command.add_mutually_exclusive_group()
+    degree.add_argument("--degree", type=int, help="refit every curve with this degree")
+    degree.add_argument("--auto-degree", action="store_true", help="choose every curve's degree by cross-validation")
+    command.add_argument("--stale", action="store_true",
+                         help="only refit curves whose points changed since they were fitted, or never fitted")
+    command.set_defaults(run=run_refit)
+
+    command = commands.add_parser("select", help="find fans that meet a duty point")
+    command.add_argument("--flow", type=float, required=True, help="duty flow rate (m³/s)")
+    command.add_argument("--pressure", type=float, required=True, help="duty pressure (Pa)")
+    command.add_argument("--pressure-tolerance", type=float, default=PRESSURE_TOLERANCE,
+                         help="allowed pressure shortfall as a fraction (default: %(default)s)")
+    command.add_argument("--max-oversize", type=float, default=MAX_OVERSIZE,
+                         help="allowed pressure excess as a fraction (default: %(default)s)")
+    command.add_argument("--flow-tolerance", type=float, default=0.0, help="flow range tolerance as a fraction")
+    command.add_argument("--brand")
+    command.add_argument("--drive-train")
+    speed = command.add_mutually_exclusive_group()
+    speed.add_argument("--speed", type=float, help="move every curve to this speed (rpm)")
+    speed.add_argument("--speed-range", type=float, nargs=2, metavar=("MIN", "MAX"),
+                       help="solve the speed within this range (rpm), for belt drives")
+    command.add_argument("--limit", type=int)
+    command.add_argument("--format", choices=["table", "csv", "json"], default="table")
+    command.set_defaults(run=run_select)
+
+    command = commands.add_parser("report", help="generate LaTeX reports from JSON specifications")
+    command.add_argument("specs", nargs="+")
+    command.add_argument("--output", default=".", help="folder for the .tex and .pdf files")
+    command.add_argument("--jobs", type=int, help="reports built at once (default: one per core)")
+    command.add_argument("--no-cache", action="store_true", help="compile every report even if unchanged")
+    command.add_argument("--no-format", action="store_true", help="load the preamble packages on every pass")
+    command.set_defaults(run=run_report)
+
+    command = commands.add_parser("gc-images", help="delete curve images no longer referenced")
+    command.add_argument("--grace", type=float, default=GC_GRACE_SECONDS,
+                         help="keep images newer than this many seconds (default: %(default)s)")
+    command.set_defaults(run=run_gc_images)
+
+    return parser
+
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    set_db_path(args.db)
+    ensure_schema()
+    return args.run(args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,237 @@
+import os
+import queue
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+# Database setup
+DB_PATH = os.path.join(os.getcwd(), "db.sqlite")
+
+# Maximum number of open connections shared by all Streamlit sessions
+POOL_SIZE = 8
+
+# Seconds a caller waits for a free connection before giving up
+POOL_TIMEOUT = 30
+
+# Storage settings
+# WAL lets readers keep working while a single writer commits
+JOURNAL_MODE = "WAL"
+# NORMAL is durable across application crashes in WAL mode and skips an fsync per commit
+SYNCHRONOUS = "NORMAL"
+# Milliseconds a connection retries on a locked database before raising "database is locked"
+BUSY_TIMEOUT_MS = 5000
+# Pages written to the WAL before a commit triggers an automatic checkpoint
+WAL_AUTOCHECKPOINT_PAGES = 1000
+# Bytes the WAL file is truncated back to after a checkpoint
+JOURNAL_SIZE_LIMIT = 8 * 1024 * 1024
+# Seconds between background checkpoints
+CHECKPOINT_INTERVAL = 60
+# WAL size in bytes above which the background checkpoint resets the file
+WAL_TRUNCATE_SIZE = 32 * 1024 * 1024
+
+
+def apply_pragmas(conn):
+    """Apply the per-connection settings every pooled connection needs."""
+    conn.execute(f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}")
+    conn.execute(f"PRAGMA synchronous = {SYNCHRONOUS}")
+    conn.execute(f"PRAGMA wal_autocheckpoint = {WAL_AUTOCHECKPOINT_PAGES}")
+    conn.execute(f"PRAGMA journal_size_limit = {JOURNAL_SIZE_LIMIT}")
+    conn.execute("PRAGMA foreign_keys = ON")
+
+
+def configure_storage(db_path):
+    """Switch the database file to the configured journal mode.
+
+    The journal mode is stored in the database file itself, so this only
+    needs to run once per process rather than on every connection.
+    """
+    conn = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT_MS / 1000)
+    try:
+        mode = conn.execute(f"PRAGMA journal_mode = {JOURNAL_MODE}").fetchone()[0]
+    finally:
+        conn.close()
+    return mode
+
+
+class Checkpointer(threading.Thread):
+    """Background thread that checkpoints the WAL so it doesn't grow unbounded.
+
+    A PASSIVE checkpoint never blocks readers or the writer; once the WAL
+    passes WAL_TRUNCATE_SIZE a TRUNCATE checkpoint resets the file.
+    """
+
+    def __init__(self, db_path, interval=CHECKPOINT_INTERVAL):
+        super().__init__(name="sqlite-checkpointer", daemon=True)
+        self.db_path = db_path
+        self.interval = interval
+        self._stop_event = threading.Event()
+
+    def run(self):
+        conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+        try:
+            while not self._stop_event.wait(self.interval):
+                self.checkpoint(conn)
+        finally:
+            conn.close()
+
+    def checkpoint(self, conn):
+        wal_path = self.db_path + "-wal"
+        mode = "PASSIVE"
+        if os.path.exists(wal_path) and os.path.getsize(wal_path) > WAL_TRUNCATE_SIZE:
+            mode = "TRUNCATE"
+        try:
+            conn.execute(f"PRAGMA wal_checkpoint({mode})")
+        except sqlite3.OperationalError:
+            # Busy; the next interval will try again
+            pass
+
+    def stop(self):
+        self._stop_event.set()
+
+
+class ConnectionPool:
+    """Process-wide pool of SQLite connections.
+
+    Streamlit runs each session on its own thread, so connections are opened
+    with ``check_same_thread=False`` and handed to one thread at a time.
+    """
+
+    def __init__(self, db_path, size=POOL_SIZE):
+        self.db_path = db_path
+        self.size = size
+        self._idle = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=BUSY_TIMEOUT_MS / 1000, check_same_thread=False)
+        apply_pragmas(conn)
+        return conn
+
+    def acquire(self, timeout=POOL_TIMEOUT):
+        """Take an idle connection, opening a new one while under the pool size."""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+
+        with self._lock:
+            can_open = self._opened < self.size
+            if can_open:
+                self._opened += 1
+
+        if can_open:
+            try:
+                return self._connect()
+            except sqlite3.Error:
+                with self._lock:
+                    self._opened -= 1
+                raise
+
+        try:
+            return self._idle.get(timeout=timeout)
+        except queue.Empty:
+            raise sqlite3.OperationalError("Timed out waiting for a database connection")
+
+    def release(self, conn):
+        """Return a connection to the pool."""
+        self._idle.put(conn)
+
+    def discard(self, conn):
+        """Close a connection that can no longer be reused."""
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+        with self._lock:
+            self._opened -= 1
+
+    def close(self):
+        """Close every idle connection."""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self.discard(conn)
+
+
+_pool = None
+_checkpointer = None
+_pool_lock = threading.Lock()
+
+
+def get_pool():
+    """Return the shared connection pool, configuring storage on first use."""
+    global _pool, _checkpointer
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                configure_storage(DB_PATH)
+                _checkpointer = Checkpointer(DB_PATH)
+                _checkpointer.start()
+                _pool = ConnectionPool(DB_PATH)
+    return _pool
+
+
+def set_db_path(db_path):
+    """Point the data-access layer at a different database file."""
+    global _pool, _checkpointer, DB_PATH
+    with _pool_lock:
+        if _checkpointer is not None:
+            _checkpointer.stop()
+        if _pool is not None:
+            _pool.close()
+        DB_PATH = os.path.abspath(db_path)
+        _pool = None
+        _checkpointer = None
+
+
+@contextmanager
+def get_connection(write=False):
+    """Borrow a pooled connection; commit on success and roll back on error.
+
+    Pass ``write=True`` for transactions that modify data. The write lock is
+    then taken up front with BEGIN IMMEDIATE, so concurrent writers queue on
+    the busy timeout instead of failing mid-transaction, while WAL readers
+    carry on unaffected.
+    """
+    pool = get_pool()
+    conn = pool.acquire()
+    try:
+        if write:
+            conn.execute("BEGIN IMMEDIATE")
+        yield conn
+        conn.commit()
+    except BaseException:
+        try:
+            conn.rollback()
+        except sqlite3.Error:
+            pool.discard(conn)
+            raise
+        pool.release(conn)
+        raise
+    else:
+        pool.release(conn)
+
+
+def get_catalog_versions():
+    """Return the write counter of each cached catalog table, as ``{table: version}``.
+
+    The counters live in catalog_version and are bumped by bump_catalog_version
+    in every write transaction that changes a catalog table, whichever process
+    makes it.
+    """
+    with get_connection() as conn:
+        return dict(conn.execute("SELECT name, version FROM catalog_version").fetchall())
+
+
+def bump_catalog_version(conn, *tables):
+    """Count one write to each of ``tables`` inside the caller's write transaction ``conn``.
+
+    Call it once per transaction that inserts, updates or deletes rows of
+    brands, fan_data or curve_fits, however many rows change, so the bump
+    commits or rolls back with the rows.
+    """
+    placeholders = ", ".join("?" * len(tables))
+    conn.execute(f"UPDATE catalog_version SET version = version + 1 WHERE name IN ({placeholders})", tables)
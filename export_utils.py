@@ -0,0 +1,128 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from catalog_utils import get_brands
+from curve_utils import unpack_curve
+from db_utils import get_connection
+from import_utils import IMPORT_COLUMNS, PARQUET_BRANDS_KEY, PARQUET_SUFFIXES
+
+
+# Models read from the database per batch when exporting; each batch is one Parquet row group
+EXPORT_BATCH_MODELS = 1000
+
+# Compression codec for Parquet exports
+PARQUET_COMPRESSION = "zstd"
+
+# Parquet layout: one row per model, the curve as two list<double> columns
+PARQUET_SCHEMA = pa.schema(
+    [(column, pa.string()) for column in IMPORT_COLUMNS[:6]]
+    + [("flow_rate", pa.list_(pa.float64())), ("pressure", pa.list_(pa.float64()))]
+)
+
+# Curve of a model with no stored points
+NO_POINTS = (np.empty(0), np.empty(0))
+
+# Long-form stand-in for a model with no points: one row with blank flow rate and pressure
+MODEL_ONLY_ROW = (np.array([np.nan]), np.array([np.nan]))
+
+
+# =============================================================================#
+# Catalog export
+# The catalog is written in the same layouts the importer reads, so an export
+# can be re-imported as is: CSV in long form (one row per measured point, or
+# one model-only row for a model without points) and Parquet with one row per
+# model. Models are read in batches with fetchmany and appended to the
+# output, keeping memory flat.
+
+def iter_model_batches(batch_models=EXPORT_BATCH_MODELS):
+    """Yield ``(attributes, curves)`` for batches of models.
+
+    ``attributes`` maps each of the six model columns of IMPORT_COLUMNS to a
+    list of values and ``curves`` is a list of ``(flow_rates, pressures)``;
+    a model with no stored points has two empty arrays.
+    """
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT d.brand, d.model_number, d.model_number_group, d.speed, d.blade_angle, d.drive_train,
+                   p.curve_points
+            FROM fan_data d
+            LEFT JOIN performance_data p ON p.fan_id = d.id AND p.curve_points IS NOT NULL
+            ORDER BY d.id
+        """)
+        while True:
+            rows = cursor.fetchmany(batch_models)
+            if not rows:
+                break
+            attributes = {column: [row[i] for row in rows] for i, column in enumerate(IMPORT_COLUMNS[:6])}
+            yield attributes, [unpack_curve(row[6]) if row[6] is not None else NO_POINTS for row in rows]
+
+
+def iter_catalog(batch_models=EXPORT_BATCH_MODELS):
+    """Yield the catalog as long-form DataFrames with IMPORT_COLUMNS, one batch of models at a time.
+
+    A model with no points gets one model-only row with NaN flow rate and pressure.
+    """
+    for attributes, curves in iter_model_batches(batch_models):
+        curves = [curve if len(curve[0]) else MODEL_ONLY_ROW for curve in curves]
+        counts = [len(flow_rates) for flow_rates, _ in curves]
+        batch = {column: np.repeat(np.array(values, dtype=object), counts) for column, values in attributes.items()}
+        batch["flow_rate"] = np.concatenate([flow_rates for flow_rates, _ in curves])
+        batch["pressure"] = np.concatenate([pressures for _, pressures in curves])
+        yield pd.DataFrame(batch, columns=list(IMPORT_COLUMNS))
+
+
+def export_catalog_csv(path, batch_models=EXPORT_BATCH_MODELS):
+    """Write the catalog to a CSV file the importer can read back; returns the number of points.
+
+    Models with no points are written as model-only rows with blank flow
+    rate and pressure, which the importer reads back as models without a curve.
+    """
+    points = 0
+    header = True
+    with open(path, "w", newline="", encoding="utf-8") as file:
+        for batch in iter_catalog(batch_models):
+            batch.to_csv(file, header=header, index=False)
+            header = False
+            points += int(batch["flow_rate"].notna().sum())
+        if header:
+            pd.DataFrame(columns=list(IMPORT_COLUMNS)).to_csv(file, index=False)
+    return points
+
+
+def curves_to_lists(curves):
+    """Pack curves into ``(flow_rate, pressure)`` Arrow list arrays sharing one offsets buffer."""
+    offsets = pa.array(np.concatenate([[0], np.cumsum([len(flow_rates) for flow_rates, _ in curves])]), pa.int32())
+    flow_rates = pa.array(np.concatenate([flow_rates for flow_rates, _ in curves]).astype(np.float64))
+    pressures = pa.array(np.concatenate([pressures for _, pressures in curves]).astype(np.float64))
+    return pa.ListArray.from_arrays(offsets, flow_rates), pa.ListArray.from_arrays(offsets, pressures)
+
+
+def export_catalog_parquet(path, batch_models=EXPORT_BATCH_MODELS):
+    """Write the catalog to a Parquet file, one row group per batch of models; returns the number of models.
+
+    Every brand, including brands with no models yet, is listed in the
+    file's metadata so an import restores the full brand table.
+    """
+    brands = json.dumps([brand["name"] for brand in get_brands()]).encode()
+    schema = PARQUET_SCHEMA.with_metadata({PARQUET_BRANDS_KEY: brands})
+    models = 0
+    with pq.ParquetWriter(path, schema, compression=PARQUET_COMPRESSION) as writer:
+        for attributes, curves in iter_model_batches(batch_models):
+            flow_rates, pressures = curves_to_lists(curves)
+            columns = [pa.array(values, pa.string()) for values in attributes.values()] + [flow_rates, pressures]
+            writer.write_batch(pa.record_batch(columns, schema=schema))
+            models += len(curves)
+    return models
+
+
+def export_catalog(path, batch_models=EXPORT_BATCH_MODELS):
+    """Export to Parquet or CSV depending on the file suffix; returns ``(count, unit)``."""
+    if os.path.splitext(path)[1].lower() in PARQUET_SUFFIXES:
+        return export_catalog_parquet(path, batch_models), "models"
+    return export_catalog_csv(path, batch_models), "points"
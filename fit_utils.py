@@ -0,0 +1,538 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import numpy as np
+import streamlit as st
+
+from affinity_utils import parse_speed
+from curve_utils import curve_digest, load_all_curves, load_curves, unpack_curve
+from db_utils import bump_catalog_version, get_catalog_versions, get_connection
+
+
+# Stored in curve_fits.basis: power series in the flow normalised to [flow_min, flow_max]
+FIT_BASIS = "unit_power"
+
+# Degree used for models that have never been fitted when automatic selection is not wanted
+DEFAULT_FIT_DEGREE = 2
+
+# Highest degree offered on the performance page and tried by automatic selection
+MAX_FIT_DEGREE = 7
+
+# Samples across the fitted flow range used to find a curve's pressure envelope
+ENVELOPE_SAMPLES = 64
+
+# Fit pressure so it never rises with flow over the fitted range
+ENFORCE_DECREASING = True
+
+# Samples across the fitted range where a decreasing fit is checked and constrained
+MONOTONE_SAMPLES = 64
+
+# Iteration cap for the active-set solve that makes a fit decreasing
+MONOTONE_MAX_ITERATIONS = 200
+
+# Worker threads evaluating candidate degrees; numpy's solvers release the GIL
+DEGREE_SEARCH_WORKERS = 4
+
+
+# =============================================================================#
+# Coefficient storage
+# A fit is a polynomial in the normalised flow t = (Q - centre) / half_width,
+# which maps the fitted flow range [flow_min, flow_max] onto [-1, 1]. Fitting
+# and evaluating on [-1, 1] keeps high degrees well conditioned whatever the
+# flow units. Coefficients are stored highest power of t first as packed
+# little-endian float64, so no precision is lost.
+
+def pack_coefficients(coefficients):
+    """Pack polynomial coefficients into a BLOB."""
+    return np.ascontiguousarray(coefficients, dtype="<f8").tobytes()
+
+
+def unpack_coefficients(blob):
+    """Unpack polynomial coefficients from a BLOB."""
+    return np.frombuffer(blob, dtype="<f8")
+
+
+def fit_domain(flow_min, flow_max):
+    """Return the centre and half-width of fitted flow ranges; a zero-width range gets half-width 1."""
+    flow_min = np.asarray(flow_min, dtype=float)
+    flow_max = np.asarray(flow_max, dtype=float)
+    half_width = (flow_max - flow_min) / 2
+    return (flow_max + flow_min) / 2, np.where(half_width > 0, half_width, 1.0)
+
+
+def to_unit_flow(flow_rates, flow_min, flow_max):
+    """Map flow rates ``(curves, samples)`` onto each curve's normalised [-1, 1] range."""
+    centre, half_width = fit_domain(flow_min, flow_max)
+    return (np.asarray(flow_rates, dtype=float) - centre[..., None]) / half_width[..., None]
+
+
+def raw_coefficients(coefficients, flow_min, flow_max):
+    """Convert one fit to ordinary power coefficients in flow, highest power first, for display."""
+    centre, half_width = fit_domain(flow_min, flow_max)
+    series = np.polynomial.Polynomial(coefficients[::-1], domain=[centre - half_width, centre + half_width])
+    return series.convert().coef[::-1]
+
+
+# =============================================================================#
+# Vectorised fitting
+
+def stack_coefficients(coefficients):
+    """Stack coefficient arrays of mixed degree into one matrix, left-padded with zeros.
+
+    Leading zeros leave each polynomial's value unchanged under Horner's rule.
+    """
+    terms = max((len(c) for c in coefficients), default=1)
+    matrix = np.zeros((len(coefficients), terms))
+    for i, c in enumerate(coefficients):
+        matrix[i, terms - len(c):] = c
+    return matrix
+
+
+def clean_curve(flow_rates, pressures):
+    """Drop points where either value is missing."""
+    flow_rates = np.asarray(flow_rates, dtype=float)
+    pressures = np.asarray(pressures, dtype=float)
+    valid = ~(np.isnan(flow_rates) | np.isnan(pressures))
+    return flow_rates[valid], pressures[valid]
+
+
+def evaluate_stacked(coefficients, unit_flows):
+    """Evaluate many polynomials at once with Horner's rule.
+
+    ``coefficients`` is ``(curves, terms)`` highest power first and
+    ``unit_flows`` is ``(curves, samples)`` of normalised flows; returns
+    ``(curves, samples)``.
+    """
+    result = np.zeros(np.broadcast_shapes(coefficients.shape[:1], unit_flows.shape[:1]) + unit_flows.shape[1:])
+    for term in range(coefficients.shape[1]):
+        result = result * unit_flows + coefficients[:, term, None]
+    return result
+
+
+def evaluate_fits(coefficients, flow_min, flow_max, flow_rates):
+    """Evaluate many fits at flow rates ``(curves, samples)``; returns ``(curves, samples)``."""
+    return evaluate_stacked(coefficients, to_unit_flow(flow_rates, flow_min, flow_max))
+
+
+def pressure_envelope(coefficients, flow_min, flow_max, samples=ENVELOPE_SAMPLES):
+    """Return the minimum and maximum fitted pressure of each curve over its flow range."""
+    # Every fit spans t in [-1, 1], so one grid serves all curves
+    pressures = evaluate_stacked(coefficients, np.linspace(-1.0, 1.0, samples)[None, :])
+    return pressures.min(axis=1), pressures.max(axis=1)
+
+
+def _slope_rows(degree, unit_flows):
+    """Rows giving dP/dt at each normalised flow as a linear function of the coefficients."""
+    powers = np.arange(degree, -1, -1)
+    return powers * unit_flows[:, None] ** np.maximum(powers - 1, 0)
+
+
+def _peak_slope(coefficients):
+    """Return the highest slope of a fit anywhere on [-1, 1], from the turning points of its slope."""
+    slope = np.polyder(coefficients)
+    turning = np.roots(np.polyder(slope)) if len(slope) > 1 else np.array([])
+    turning = turning[np.isreal(turning)].real
+    return np.polyval(slope, np.concatenate([[-1.0, 1.0], turning[np.abs(turning) <= 1]])).max()
+
+
+def _fit_decreasing(vander, pressures):
+    """Least-squares fit one curve with its slope never positive on [-1, 1].
+
+    A primal active-set solve of the convex quadratic programme, started from
+    the flat fit through the mean pressure, which is always feasible. Each
+    step solves the least-squares problem with the working set of grid slopes
+    held at zero, moves as far towards it as the other slopes allow and then
+    adds the slope that blocked the move, or drops the constraint with the
+    most negative multiplier once the step vanishes. The slope is only held
+    on the monotone sample grid and can peak slightly above zero between
+    samples, so that peak is then taken off the linear term, which moves
+    fitted pressures by no more than the rise it removes.
+    """
+    degree = vander.shape[1] - 1
+    slopes = _slope_rows(degree, np.linspace(-1.0, 1.0, MONOTONE_SAMPLES))
+    gram, target = vander.T @ vander, vander.T @ pressures
+    coefficients = np.zeros(degree + 1)
+    coefficients[-1] = pressures.mean()
+    working = []
+    for _ in range(MONOTONE_MAX_ITERATIONS):
+        held = slopes[working]
+        kkt = np.block([[gram, held.T], [held, np.zeros((len(working), len(working)))]])
+        solution = np.linalg.lstsq(kkt, np.concatenate([target, np.zeros(len(working))]), rcond=None)[0]
+        step = solution[:degree + 1] - coefficients
+        if np.linalg.norm(step) <= 1e-10 * (1 + np.linalg.norm(coefficients)):
+            multipliers = solution[degree + 1:]
+            if not working or multipliers.min() >= 0:
+                break
+            working.pop(int(np.argmin(multipliers)))
+            continue
+        rates = slopes @ step
+        rates[working] = 0
+        with np.errstate(divide="ignore", invalid="ignore"):
+            limits = np.where(rates > 0, np.maximum(-(slopes @ coefficients), 0) / rates, np.inf)
+        blocking = int(np.argmin(limits))
+        coefficients = coefficients + min(limits[blocking], 1.0) * step
+        if limits[blocking] < 1:
+            working.append(blocking)
+    coefficients[-2] -= max(_peak_slope(coefficients), 0.0)
+    return coefficients
+
+
+def fit_stacked(flow_rates, pressures, degree, decreasing=ENFORCE_DECREASING):
+    """Least-squares fit every row of two ``(curves, points)`` arrays in one solve.
+
+    Each row is fitted on its own normalised flow range. Returns
+    ``(coefficients, r_squared, rmse, cv_rmse)`` with coefficients shaped
+    ``(curves, degree + 1)``, highest power first. ``cv_rmse`` is the
+    leave-one-out cross-validation error of the unconstrained fit, computed
+    in closed form from the hat matrix (NaN when the fit interpolates, so a
+    left-out point has no prediction).
+    """
+    unit_flows = to_unit_flow(flow_rates, flow_rates.min(axis=1), flow_rates.max(axis=1))
+    vander = unit_flows[..., None] ** np.arange(degree, -1, -1)
+    solver = np.linalg.pinv(vander)
+    coefficients = (solver @ pressures[..., None])[..., 0]
+
+    residuals = pressures - (vander @ coefficients[..., None])[..., 0]
+    leverage = np.einsum("cpk,ckp->cp", vander, solver)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        loo = np.where(leverage < 1 - 1e-9, residuals / (1 - leverage), np.nan)
+    cv_rmse = np.sqrt((loo ** 2).mean(axis=1))
+
+    if decreasing and degree > 0:
+        slopes = _slope_rows(degree, np.linspace(-1.0, 1.0, MONOTONE_SAMPLES)) @ coefficients.T
+        rising = np.flatnonzero((slopes > 1e-9 * np.abs(pressures).max(axis=1)).any(axis=0))
+        for i in rising:
+            coefficients[i] = _fit_decreasing(vander[i], pressures[i])
+        residuals = pressures - (vander @ coefficients[..., None])[..., 0]
+
+    residual = (residuals ** 2).sum(axis=1)
+    total = ((pressures - pressures.mean(axis=1, keepdims=True)) ** 2).sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        r_squared = np.where(total > 0, 1 - residual / total, 1.0)
+    rmse = np.sqrt(residual / flow_rates.shape[1])
+    return coefficients, r_squared, rmse, cv_rmse
+
+
+def _group_curves(curves, degrees):
+    """Clean curves and group them by (point count, degree) for batched solves."""
+    groups = {}
+    for fan_id, (flow_rates, pressures) in curves.items():
+        flow_rates, pressures = clean_curve(flow_rates, pressures)
+        points = len(flow_rates)
+        if points < 2:
+            continue
+        degree = min(degrees[fan_id], points - 1)
+        groups.setdefault((points, degree), []).append((fan_id, flow_rates, pressures))
+    return groups
+
+
+def select_degrees(curves, max_degree=MAX_FIT_DEGREE):
+    """Choose each curve's degree by leave-one-out cross-validation.
+
+    Every candidate degree from 1 up to ``max_degree`` (and below the point
+    count less one, so a point is always left to predict) is fitted for all
+    curves in batched solves, with the candidate degrees evaluated in
+    parallel threads. The degree with the lowest cross-validation error wins;
+    ties go to the lower degree and a degree without an error (one that
+    interpolates) ranks last. Returns ``{fan_id: degree}``.
+    """
+    candidates = {}
+    for fan_id, (flow_rates, pressures) in curves.items():
+        points = len(clean_curve(flow_rates, pressures)[0])
+        candidates[fan_id] = range(1, max(min(max_degree, points - 2), 1) + 1)
+
+    def score(degree):
+        members = {fan_id: curves[fan_id] for fan_id, degrees in candidates.items() if degree in degrees}
+        scores = {}
+        for (_, fitted_degree), group in _group_curves(members, dict.fromkeys(members, degree)).items():
+            _, _, _, cv_rmse = fit_stacked(
+                np.stack([member[1] for member in group]), np.stack([member[2] for member in group]), fitted_degree,
+                decreasing=False,
+            )
+            scores.update((member[0], error) for member, error in zip(group, cv_rmse))
+        return degree, scores
+
+    best = {}
+    with ThreadPoolExecutor(max_workers=DEGREE_SEARCH_WORKERS) as pool:
+        for degree, scores in sorted(pool.map(score, range(1, max_degree + 1))):
+            for fan_id, error in scores.items():
+                error = np.inf if np.isnan(error) else error
+                if fan_id not in best or error < best[fan_id][1]:
+                    best[fan_id] = (degree, error)
+    return {fan_id: degree for fan_id, (degree, _) in best.items()}
+
+
+def fit_curves(curves, degrees=None, default_degree=DEFAULT_FIT_DEGREE, decreasing=ENFORCE_DECREASING):
+    """Fit many curves, batching those with the same point count and degree.
+
+    ``curves`` maps fan_id to ``(flow_rates, pressures)``; ``degrees`` optionally
+    maps fan_id to the degree to use. A degree of None, or a ``default_degree``
+    of None for curves without one, selects the degree by cross-validation.
+    A degree is capped at points - 1. Returns a list of fit dicts, one per
+    curve with at least two points, stamped with the fit time and a digest of
+    the points as given.
+    """
+    fitted_at = datetime.now().isoformat(timespec="seconds")
+    degrees = {fan_id: (degrees or {}).get(fan_id, default_degree) for fan_id in curves}
+    automatic = {fan_id: curves[fan_id] for fan_id, degree in degrees.items() if degree is None}
+    if automatic:
+        degrees.update(select_degrees(automatic))
+        # Curves too short for any candidate have no selected degree; they are skipped below
+        degrees = {fan_id: degree for fan_id, degree in degrees.items() if degree is not None}
+        curves = {fan_id: curves[fan_id] for fan_id in degrees}
+
+    fits = []
+    for (points, degree), members in _group_curves(curves, degrees).items():
+        flow_stack = np.stack([member[1] for member in members])
+        pressure_stack = np.stack([member[2] for member in members])
+        coefficients, r_squared, rmse, cv_rmse = fit_stacked(flow_stack, pressure_stack, degree, decreasing)
+        flow_min = flow_stack.min(axis=1)
+        flow_max = flow_stack.max(axis=1)
+        pressure_min, pressure_max = pressure_envelope(coefficients, flow_min, flow_max)
+        for i, (fan_id, _, _) in enumerate(members):
+            fits.append({
+                "fan_id": fan_id,
+                "degree": degree,
+                "coefficients": coefficients[i],
+                "r_squared": float(r_squared[i]),
+                "rmse": float(rmse[i]),
+                # Stored as NULL when the fit interpolates its points
+                "cv_rmse": None if np.isnan(cv_rmse[i]) else float(cv_rmse[i]),
+                "flow_min": float(flow_min[i]),
+                "flow_max": float(flow_max[i]),
+                "pressure_min": float(pressure_min[i]),
+                "pressure_max": float(pressure_max[i]),
+                "point_count": points,
+                "basis": FIT_BASIS,
+                "fitted_at": fitted_at,
+                "source_digest": curve_digest(*curves[fan_id]),
+            })
+    return fits
+
+
+def fit_curve(flow_rates, pressures, degree=None, decreasing=ENFORCE_DECREASING):
+    """Fit a single curve, choosing the degree automatically when none is given.
+
+    Returns a fit dict or None with fewer than two points.
+    """
+    fits = fit_curves({None: (flow_rates, pressures)}, {None: degree}, decreasing=decreasing)
+    return fits[0] if fits else None
+
+
+def format_equation(fit):
+    """Format a fit as the polynomial_function text shown to engineers, in flow, lowest power first."""
+    coefficients = raw_coefficients(fit["coefficients"], fit["flow_min"], fit["flow_max"])
+    return " + ".join([f"{coeff:.2f}x^{i}" for i, coeff in enumerate(coefficients[::-1])])
+
+
+# =============================================================================#
+# Persistence
+
+SAVE_FIT_SQL = """
+    INSERT OR REPLACE INTO curve_fits
+        (fan_id, degree, coefficients, r_squared, rmse, cv_rmse, flow_min, flow_max, pressure_min, pressure_max,
+         point_count, basis, fitted_at, source_digest)
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+
+def fit_to_row(fit):
+    """Convert a fit dict to a curve_fits row tuple."""
+    return (
+        fit["fan_id"], fit["degree"], pack_coefficients(fit["coefficients"]), fit["r_squared"],
+        fit["rmse"], fit["cv_rmse"], fit["flow_min"], fit["flow_max"], fit["pressure_min"], fit["pressure_max"],
+        fit["point_count"], fit["basis"], fit["fitted_at"], fit["source_digest"],
+    )
+
+
+def save_fits(fits, conn=None):
+    """Insert or replace fit records in one transaction, or in the caller's write transaction ``conn``."""
+    rows = [fit_to_row(fit) for fit in fits]
+    if conn is None:
+        with get_connection(write=True) as conn:
+            conn.executemany(SAVE_FIT_SQL, rows)
+            bump_catalog_version(conn, "curve_fits")
+    else:
+        conn.executemany(SAVE_FIT_SQL, rows)
+        bump_catalog_version(conn, "curve_fits")
+    invalidate_fit_index()
+
+
+def get_fit_degrees():
+    """Fetch the degree each model was last fitted with."""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT fan_id, degree FROM curve_fits")
+        return dict(cursor.fetchall())
+
+
+def load_fits(fan_ids=None):
+    """Fetch stored fits as ``{fan_id: fit dict}``, optionally for selected models."""
+    query = """
+        SELECT fan_id, degree, coefficients, r_squared, rmse, cv_rmse, flow_min, flow_max, pressure_min,
+               pressure_max, point_count, basis, fitted_at, source_digest
+        FROM curve_fits
+    """
+    params = ()
+    if fan_ids is not None:
+        fan_ids = list(fan_ids)
+        query += f" WHERE fan_id IN ({', '.join('?' * len(fan_ids))})"
+        params = fan_ids
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute(query, params)
+        return {
+            row[0]: {
+                "fan_id": row[0],
+                "degree": row[1],
+                "coefficients": unpack_coefficients(row[2]),
+                "r_squared": row[3],
+                "rmse": row[4],
+                "cv_rmse": row[5],
+                "flow_min": row[6],
+                "flow_max": row[7],
+                "pressure_min": row[8],
+                "pressure_max": row[9],
+                "point_count": row[10],
+                "basis": row[11],
+                "fitted_at": row[12],
+                "source_digest": row[13],
+            }
+            for row in cursor.fetchall()
+        }
+
+
+def find_stale_fits():
+    """Return the fan_ids whose fit is missing or was made from points other than those stored."""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT p.fan_id, p.curve_points, f.source_digest
+            FROM performance_data p LEFT JOIN curve_fits f ON f.fan_id = p.fan_id
+            WHERE p.curve_points IS NOT NULL
+        """)
+        return [fan_id for fan_id, blob, digest in cursor if curve_digest(*unpack_curve(blob)) != digest]
+
+
+def refit_catalog(degree=None, automatic=False, stale_only=False):
+    """Refit stored curves and persist the results.
+
+    Each model keeps the degree it was last fitted with unless ``degree`` is
+    given, or ``automatic`` asks for every degree to be chosen by
+    cross-validation; models never fitted use DEFAULT_FIT_DEGREE. With
+    ``stale_only`` only curves found by find_stale_fits are refitted.
+    Returns the fits.
+    """
+    curves = load_curves(find_stale_fits()) if stale_only else load_all_curves()
+    if automatic:
+        fits = fit_curves(curves, default_degree=None)
+    elif degree is not None:
+        fits = fit_curves(curves, default_degree=degree)
+    else:
+        fits = fit_curves(curves, get_fit_degrees())
+    save_fits(fits)
+    return fits
+
+
+# =============================================================================#
+# Fit index
+# Every stored fit packed into flat arrays for vectorised searches. The
+# coefficient matrix is left-padded with zeros to a common number of terms,
+# which leaves each polynomial's value unchanged under Horner's rule. Like the
+# catalog caches, the index is keyed by the write counters of the tables it
+# reads, so fits saved by another process are picked up on the next search.
+
+@st.cache_resource(show_spinner=False, max_entries=1)
+def _load_fit_index(versions):
+    """Load all fits with their model attributes into column arrays; ``versions`` are the write counters."""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("""
+            SELECT f.fan_id, d.model_number, d.model_number_group, d.brand, d.speed, d.blade_angle, d.drive_train,
+                   f.coefficients, f.flow_min, f.flow_max, f.pressure_min, f.pressure_max, f.basis
+            FROM curve_fits f JOIN fan_data d ON d.id = f.fan_id
+            ORDER BY f.fan_id
+        """)
+        rows = cursor.fetchall()
+    for row in rows:
+        _check_basis({"fan_id": row[0], "basis": row[12]})
+
+    matrix = stack_coefficients([unpack_coefficients(row[7]) for row in rows])
+
+    return {
+        "fan_id": np.array([row[0] for row in rows], dtype=np.int64),
+        "model_number": np.array([row[1] for row in rows], dtype=object),
+        "model_number_group": np.array([row[2] for row in rows], dtype=object),
+        "brand": np.array([row[3] for row in rows], dtype=object),
+        "speed": np.array([row[4] for row in rows], dtype=object),
+        "speed_rpm": np.array([parse_speed(row[4]) for row in rows], dtype=float),
+        "blade_angle": np.array([row[5] for row in rows], dtype=object),
+        "drive_train": np.array([row[6] for row in rows], dtype=object),
+        "coefficients": matrix,
+        "flow_min": np.array([row[8] for row in rows], dtype=float),
+        "flow_max": np.array([row[9] for row in rows], dtype=float),
+        "pressure_min": np.array([row[10] for row in rows], dtype=float),
+        "pressure_max": np.array([row[11] for row in rows], dtype=float),
+    }
+
+
+def sample_fit_index(index, positions, flow_grid):
+    """Sample indexed fits on a shared flow grid, NaN outside each curve's fitted range."""
+    pressures = index_evaluator(index, positions)(flow_grid)
+    outside = (flow_grid < index["flow_min"][positions, None]) | (flow_grid > index["flow_max"][positions, None])
+    pressures[outside] = np.nan
+    return pressures
+
+
+def load_fit_index():
+    """Return the fit index, reloading it if the fits or models changed since it was loaded."""
+    versions = get_catalog_versions()
+    return _load_fit_index((versions["curve_fits"], versions["fan_data"]))
+
+
+def invalidate_fit_index():
+    """Drop the cached fit index so the next search reloads it."""
+    _load_fit_index.clear()
+
+
+# =============================================================================#
+# Stored fit evaluation
+# Consumers get fitted pressures as ready-to-call functions over the stored
+# coefficients; nothing is refitted. index_evaluator works on the cached fit
+# index or on one moved to another speed with the affinity laws.
+
+def _check_basis(fit):
+    if fit["basis"] != FIT_BASIS:
+        raise ValueError(f"Unsupported fit basis for fan {fit['fan_id']}: {fit['basis']}")
+
+
+def fit_evaluator(fit):
+    """Return a function giving a fit's pressure at flow rates of any shape."""
+    _check_basis(fit)
+    coefficients = np.asarray(fit["coefficients"], dtype=float)[None, :]
+
+    def evaluate(flow_rates):
+        flow_rates = np.asarray(flow_rates, dtype=float)
+        pressures = evaluate_fits(coefficients, fit["flow_min"], fit["flow_max"], flow_rates.reshape(1, -1))
+        return pressures.reshape(flow_rates.shape)
+
+    return evaluate
+
+
+def index_evaluator(index, positions):
+    """Return one vectorised function for the fits at ``positions`` of a fit index.
+
+    The function takes flow rates shared by every curve ``(samples,)`` or one
+    row per curve ``(curves, samples)`` and returns pressures
+    ``(curves, samples)`` in ``positions`` order.
+    """
+    coefficients = index["coefficients"][positions]
+    flow_min, flow_max = index["flow_min"][positions], index["flow_max"][positions]
+
+    def evaluate(flow_rates):
+        flow_rates = np.asarray(flow_rates, dtype=float)
+        flow_rates = np.broadcast_to(flow_rates, (len(coefficients), flow_rates.shape[-1]))
+        return evaluate_fits(coefficients, flow_min, flow_max, flow_rates)
+
+    return evaluate
+
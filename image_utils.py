@@ -0,0 +1,98 @@
+import hashlib
+import os
+import tempfile
+import time
+
+import db_utils
+from db_utils import get_connection
+
+
+# =============================================================================#
+# Content-addressed curve image store
+# Rendered curve PNGs are kept as files named by the SHA-256 of their bytes,
+# next to the database, e.g. curve_images/3f/3fa4...e1.png. performance_data
+# only holds the digest, so curve queries never page image bytes through
+# SQLite. Identical images are stored once. A save that replaces or clears
+# an image collects that image; `python -m data_capture gc-images` sweeps the
+# whole store for anything left behind, such as images still inside the
+# grace period when they were replaced.
+
+IMAGE_STORE_DIR = "curve_images"
+IMAGE_SUFFIX = ".png"
+
+# Seconds an unreferenced image is kept before garbage collection removes it.
+# Images are written before the row that references them commits, so fresh
+# files must survive a concurrent collection.
+GC_GRACE_SECONDS = 3600
+
+
+def get_image_store_path():
+    """Return the image store directory for the current database."""
+    return os.path.join(os.path.dirname(os.path.abspath(db_utils.DB_PATH)), IMAGE_STORE_DIR)
+
+
+def image_path(digest):
+    """Return the file path for an image digest."""
+    return os.path.join(get_image_store_path(), digest[:2], digest + IMAGE_SUFFIX)
+
+
+def store_image(data):
+    """Store image bytes and return their digest; existing images are reused."""
+    digest = hashlib.sha256(data).hexdigest()
+    path = image_path(digest)
+    if os.path.exists(path):
+        # Refresh the timestamp so a concurrent collection leaves it alone
+        os.utime(path)
+        return digest
+
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as tmp:
+            tmp.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return digest
+
+
+def get_referenced_digests():
+    """Return every image digest referenced from performance_data."""
+    with get_connection() as conn:
+        cursor = conn.cursor()
+        cursor.execute("SELECT DISTINCT curve_image_digest FROM performance_data WHERE curve_image_digest IS NOT NULL")
+        return {row[0] for row in cursor.fetchall()}
+
+
+def collect_garbage(digests=None, grace_seconds=GC_GRACE_SECONDS):
+    """Delete stored images no row references; returns the number removed.
+
+    Pass ``digests`` to check only those images (e.g. the one a save just
+    replaced) instead of scanning the whole store.
+    """
+    store_path = get_image_store_path()
+    if digests is None:
+        if not os.path.isdir(store_path):
+            return 0
+        digests = [
+            name[:-len(IMAGE_SUFFIX)]
+            for shard in os.listdir(store_path)
+            if os.path.isdir(os.path.join(store_path, shard))
+            for name in os.listdir(os.path.join(store_path, shard))
+            if name.endswith(IMAGE_SUFFIX)
+        ]
+    digests = set(digests) - get_referenced_digests()
+
+    cutoff = time.time() - grace_seconds
+    removed = 0
+    for digest in digests:
+        path = image_path(digest)
+        try:
+            if os.path.getmtime(path) <= cutoff:
+                os.remove(path)
+                removed += 1
+        except FileNotFoundError:
+            pass
+    return removed
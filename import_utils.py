@@ -0,0 +1,321 @@
+import json
+import os
+
+import numpy as np
+import pandas as pd
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from catalog_utils import invalidate_brands, invalidate_models
+from curve_utils import load_curves, pack_curve
+from db_utils import bump_catalog_version, get_connection
+from image_utils import collect_garbage
+from fit_utils import SAVE_FIT_SQL, fit_curves, fit_to_row, format_equation, get_fit_degrees
+
+
+# Columns every import file must have, one row per measured point
+IMPORT_COLUMNS = (
+    "brand", "model_number", "model_number_group", "speed", "blade_angle", "drive_train", "flow_rate", "pressure",
+)
+
+# Model attribute columns stored in fan_data
+MODEL_COLUMNS = ("model_number", "model_number_group", "brand", "speed", "blade_angle", "drive_train")
+
+# Drive trains offered on the Fan Data Input page
+DRIVE_TRAINS = ("Direct Drive", "Belt Transmission")
+
+# Rows read and validated at a time
+CHUNK_ROWS = 10000
+
+# Buffered curves that trigger a write of completed curves
+CURVE_BATCH_MODELS = 500
+
+EXCEL_SUFFIXES = (".xlsx", ".xls")
+PARQUET_SUFFIXES = (".parquet", ".pq")
+
+# Parquet key-value metadata listing every brand, including brands with no models
+PARQUET_BRANDS_KEY = b"data_capture.brands"
+
+
+# =============================================================================#
+# Bulk catalog import
+# Import files hold one row per measured point with the model attributes
+# repeated on each row. The file is read and validated in chunks; model rows
+# are upserted once per chunk, and points are buffered per model until a batch
+# of curves is complete, then packed, fitted together and written in a single
+# transaction with executemany. Rows that fail validation are skipped and
+# reported with their line number instead of stopping the import.
+#
+# Parquet files hold one row per model with the curve in list<double>
+# flow_rate and pressure columns (see export_utils); each row group is
+# exploded into the same long form, and "line" is then the model's row number.
+
+def read_parquet_chunks(path, chunk_rows=CHUNK_ROWS):
+    """Yield a Parquet catalog as long-form DataFrames, chunk_rows models at a time.
+
+    A model whose flow_rate and pressure lists differ in length gets NaN
+    pressures, so every one of its points fails validation. A model whose
+    lists are both empty yields a single model-only row.
+    """
+    parquet = pq.ParquetFile(path)
+    missing = [column for column in IMPORT_COLUMNS if column not in parquet.schema_arrow.names]
+    if missing:
+        raise ValueError(f"Import file is missing columns: {', '.join(missing)}")
+
+    first_row = 0
+    for batch in parquet.iter_batches(batch_size=chunk_rows, columns=list(IMPORT_COLUMNS)):
+        flow, pressure = batch.column("flow_rate"), batch.column("pressure")
+        flow_lengths = pc.fill_null(pc.list_value_length(flow), 0).to_numpy()
+        pressure_lengths = pc.fill_null(pc.list_value_length(pressure), 0).to_numpy()
+        parents = pc.list_parent_indices(flow).to_numpy()
+
+        flow_rates = flow.flatten().to_numpy(zero_copy_only=False).astype(float)
+        pressures = np.full(len(flow_rates), np.nan)
+        matched = flow_lengths == pressure_lengths
+        pressure_values = pressure.flatten().to_numpy(zero_copy_only=False).astype(float)
+        pressures[matched[parents]] = pressure_values[matched[pc.list_parent_indices(pressure).to_numpy()]]
+
+        # A model with no points becomes one model-only row with blank flow rate and pressure
+        no_points = np.flatnonzero((flow_lengths == 0) & (pressure_lengths == 0))
+        order = np.argsort(np.concatenate([parents, no_points]), kind="stable")
+        parents = np.concatenate([parents, no_points])[order]
+        flow_rates = np.concatenate([flow_rates, np.full(len(no_points), np.nan)])[order]
+        pressures = np.concatenate([pressures, np.full(len(no_points), np.nan)])[order]
+
+        chunk = {
+            column: batch.column(column).to_pandas().fillna("").astype(str).to_numpy()[parents]
+            for column in IMPORT_COLUMNS[:6]
+        }
+        chunk["flow_rate"], chunk["pressure"] = flow_rates, pressures
+        chunk = pd.DataFrame(chunk, columns=list(IMPORT_COLUMNS))
+        chunk["line"] = first_row + parents + 1
+        first_row += batch.num_rows
+        yield chunk
+
+
+def read_parquet_brands(path):
+    """Return the brand list stored in a Parquet catalog's metadata."""
+    metadata = pq.read_schema(path).metadata or {}
+    brands = metadata.get(PARQUET_BRANDS_KEY)
+    return json.loads(brands) if brands else []
+
+
+def read_chunks(path, chunk_rows=CHUNK_ROWS):
+    """Yield the rows of a CSV, Excel or Parquet file as DataFrames of at most chunk_rows rows.
+
+    Each chunk carries a ``line`` column with the row's line number in the file.
+    """
+    suffix = os.path.splitext(path)[1].lower()
+    if suffix in PARQUET_SUFFIXES:
+        yield from read_parquet_chunks(path, chunk_rows)
+        return
+    if suffix in EXCEL_SUFFIXES:
+        # Excel workbooks cannot be streamed by pandas; slice the sheet instead
+        sheet = pd.read_excel(path, dtype=str, keep_default_na=False)
+        chunks = (sheet.iloc[start:start + chunk_rows] for start in range(0, len(sheet), chunk_rows))
+    else:
+        chunks = pd.read_csv(path, dtype=str, keep_default_na=False, chunksize=chunk_rows)
+
+    for chunk in chunks:
+        chunk = chunk.rename(columns=lambda column: str(column).strip().lower())
+        missing = [column for column in IMPORT_COLUMNS if column not in chunk.columns]
+        if missing:
+            raise ValueError(f"Import file is missing columns: {', '.join(missing)}")
+        chunk = chunk[list(IMPORT_COLUMNS)].copy()
+        # Line 1 is the header
+        chunk["line"] = chunk.index + 2
+        yield chunk
+
+
+def validate_chunk(chunk):
+    """Split a chunk into valid rows and per-row errors.
+
+    Text columns are stripped and must be non-empty, the drive train must be
+    one of DRIVE_TRAINS and flow rate and pressure must be finite numbers,
+    except on model-only rows where both are blank; those rows are kept
+    with NaN flow rate and pressure.
+    Returns ``(valid, errors)`` where errors are ``{"line", "model_number", "error"}``.
+    """
+    for column in MODEL_COLUMNS:
+        chunk[column] = chunk[column].astype(str).str.strip()
+    blank = {
+        column: chunk[column].isna() | (chunk[column].astype(str).str.strip() == "")
+        for column in ("flow_rate", "pressure")
+    }
+    model_only = blank["flow_rate"] & blank["pressure"]
+    flow_rate = pd.to_numeric(chunk["flow_rate"], errors="coerce")
+    pressure = pd.to_numeric(chunk["pressure"], errors="coerce")
+    chunk["flow_rate"], chunk["pressure"] = flow_rate, pressure
+
+    checks = [(chunk[column] == "", f"{column} is empty") for column in MODEL_COLUMNS]
+    checks += [
+        (~chunk["drive_train"].isin(DRIVE_TRAINS), f"drive_train must be one of: {', '.join(DRIVE_TRAINS)}"),
+        (~np.isfinite(flow_rate) & ~model_only, "flow_rate is not a number"),
+        (~np.isfinite(pressure) & ~model_only, "pressure is not a number"),
+    ]
+
+    invalid = pd.Series(False, index=chunk.index)
+    errors = []
+    for failed, message in checks:
+        # Report only the first problem on each row
+        new = failed & ~invalid
+        # A Parquet row holds a whole curve, so one line can fail on several points
+        failures = chunk.loc[new, ["line", "model_number"]].drop_duplicates()
+        errors.extend(
+            {"line": int(line), "model_number": model_number, "error": message}
+            for line, model_number in failures.itertuples(index=False, name=None)
+        )
+        invalid |= failed
+    return chunk[~invalid], errors
+
+
+def add_brands(brands):
+    """Insert any brands that don't exist yet."""
+    with get_connection(write=True) as conn:
+        conn.executemany("INSERT OR IGNORE INTO brands (name) VALUES (?)", [(brand,) for brand in brands])
+        bump_catalog_version(conn, "brands")
+
+
+def upsert_models(models):
+    """Insert or update brands and fan models in one transaction.
+
+    ``models`` is a DataFrame with MODEL_COLUMNS; returns ``{model_number: fan_id}``.
+    """
+    brands = [(brand,) for brand in models["brand"].unique()]
+    rows = list(models[list(MODEL_COLUMNS)].itertuples(index=False, name=None))
+    model_numbers = models["model_number"].tolist()
+    with get_connection(write=True) as conn:
+        conn.executemany("INSERT OR IGNORE INTO brands (name) VALUES (?)", brands)
+        conn.executemany("""
+            INSERT INTO fan_data (model_number, model_number_group, brand, speed, blade_angle, drive_train)
+            VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT (model_number) DO UPDATE SET
+                model_number_group = excluded.model_number_group,
+                brand = excluded.brand,
+                speed = excluded.speed,
+                blade_angle = excluded.blade_angle,
+                drive_train = excluded.drive_train
+        """, rows)
+        bump_catalog_version(conn, "brands", "fan_data")
+        cursor = conn.execute(
+            f"SELECT model_number, id FROM fan_data WHERE model_number IN ({', '.join('?' * len(model_numbers))})",
+            model_numbers,
+        )
+        return dict(cursor.fetchall())
+
+
+def write_curves(curves, degrees):
+    """Fit a batch of curves together and write their points and fits in one transaction.
+
+    ``curves`` maps fan_id to ``(flow_rates, pressures)``. Any stored curve
+    image is cleared because it no longer matches the points, and collected
+    from the image store. Returns the
+    fan_ids that have too few points to fit.
+    """
+    fits = {fit["fan_id"]: fit for fit in fit_curves(curves, degrees)}
+    rows = [
+        (pack_curve(flow_rates, pressures), format_equation(fits[fan_id]) if fan_id in fits else None,
+         fan_id)
+        for fan_id, (flow_rates, pressures) in curves.items()
+    ]
+    fan_ids = list(curves)
+
+    with get_connection(write=True) as conn:
+        placeholders = ", ".join("?" * len(fan_ids))
+        cursor = conn.execute(
+            f"SELECT fan_id, curve_image_digest FROM performance_data WHERE fan_id IN ({placeholders})", fan_ids
+        )
+        replaced_images = dict(cursor.fetchall())
+        existing = set(replaced_images)
+        conn.executemany("""
+            UPDATE performance_data
+            SET curve_points = ?, curve_image_digest = NULL, polynomial_function = ?
+            WHERE fan_id = ?
+        """, [row for row in rows if row[2] in existing])
+        conn.executemany("""
+            INSERT INTO performance_data (curve_points, polynomial_function, fan_id)
+            VALUES (?, ?, ?)
+        """, [row for row in rows if row[2] not in existing])
+        conn.executemany(SAVE_FIT_SQL, [fit_to_row(fit) for fit in fits.values()])
+        # A curve too short to fit must not keep the fit of the points it replaced
+        conn.executemany(
+            "DELETE FROM curve_fits WHERE fan_id = ?", [(fan_id,) for fan_id in fan_ids if fan_id not in fits]
+        )
+        bump_catalog_version(conn, "curve_fits")
+    collect_garbage([digest for digest in replaced_images.values() if digest])
+    return [fan_id for fan_id in fan_ids if fan_id not in fits]
+
+
+def import_catalog(path, degree=None, chunk_rows=CHUNK_ROWS):
+    """Import brands, fan models and performance points from a CSV, Excel or Parquet file.
+
+    Every model's stored curve is replaced by the points in the file; a
+    model listed only on model-only rows (blank flow rate and pressure, or
+    empty Parquet lists) is upserted and its stored curve left as is. Models
+    keep the degree they were last fitted with unless ``degree`` is given;
+    new models have their degree chosen by cross-validation. Returns a summary dict with row,
+    model and point counts and the list of per-row errors.
+    """
+    stored_degrees = {} if degree is not None else get_fit_degrees()
+    fan_ids = {}
+    # Points waiting to be written, per model number, as lists of array pieces
+    pending = {}
+    # Models already written during this import; later rows for them are appended to the stored curve
+    written = set()
+    summary = {"rows": 0, "models": 0, "points": 0, "errors": []}
+
+    def flush(model_numbers):
+        curves = {}
+        for model_number in model_numbers:
+            flow_pieces, pressure_pieces = pending.pop(model_number)
+            curves[fan_ids[model_number]] = (np.concatenate(flow_pieces), np.concatenate(pressure_pieces))
+        # Rows for one model split across the file: extend what was already written
+        stored = load_curves([fan_id for fan_id in curves if fan_id in written])
+        for fan_id, (flow_rates, pressures) in stored.items():
+            curves[fan_id] = (
+                np.concatenate([flow_rates, curves[fan_id][0]]), np.concatenate([pressures, curves[fan_id][1]])
+            )
+        degrees = {fan_id: stored_degrees.get(fan_id, degree) for fan_id in curves}
+        unfitted = set(write_curves(curves, degrees))
+        written.update(curves)
+        summary["errors"].extend(
+            {"line": None, "model_number": model_number, "error": "fewer than two points; stored without a fit"}
+            for model_number in model_numbers if fan_ids[model_number] in unfitted
+        )
+
+    try:
+        if os.path.splitext(path)[1].lower() in PARQUET_SUFFIXES:
+            add_brands(read_parquet_brands(path))
+
+        for chunk in read_chunks(path, chunk_rows):
+            summary["rows"] += len(chunk)
+            valid, errors = validate_chunk(chunk)
+            summary["errors"].extend(errors)
+            if valid.empty:
+                continue
+
+            models = valid.drop_duplicates("model_number", keep="last")
+            fan_ids.update(upsert_models(models))
+
+            # Model-only rows are the only valid rows without a flow rate
+            valid = valid[valid["flow_rate"].notna()]
+            for model_number, points in valid.groupby("model_number", sort=False):
+                flow_pieces, pressure_pieces = pending.setdefault(model_number, ([], []))
+                flow_pieces.append(points["flow_rate"].to_numpy(dtype=float))
+                pressure_pieces.append(points["pressure"].to_numpy(dtype=float))
+            summary["points"] += len(valid)
+
+            if len(pending) >= CURVE_BATCH_MODELS and not valid.empty:
+                # The last model in the chunk may continue in the next one
+                still_open = valid["model_number"].iloc[-1]
+                flush([model_number for model_number in pending if model_number != still_open])
+
+        if pending:
+            flush(list(pending))
+    finally:
+        # Keep the in-memory catalog and fit index in step with whatever was committed
+        invalidate_brands()
+        invalidate_models()
+
+    summary["models"] = len(fan_ids)
+    return summary
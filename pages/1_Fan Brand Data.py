@@ -1,63 +1,10 @@
-import sqlite3
 import streamlit as st
 
-# Database setup
-DB_PATH = "db.sqlite"
+from catalog_utils import get_brands, get_brand_by_name, add_brand, edit_brand, delete_brand
+from schema_utils import ensure_schema
 
-def initialize_db():
-    """Create the brands table if it doesn't exist."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS brands (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT UNIQUE NOT NULL
-        )
-    """)
-    conn.commit()
-    conn.close()
-
-def get_brands():
-    """Fetch all brand names from the database."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, name FROM brands")
-    brands = [{"id": row[0], "name": row[1]} for row in cursor.fetchall()]
-    conn.close()
-    return brands
-
-def add_brand(brand_name):
-    """Add a new brand to the database."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    try:
-        cursor.execute("INSERT INTO brands (name) VALUES (?)", (brand_name,))
-        conn.commit()
-    except sqlite3.IntegrityError:
-        st.warning("Brand already exists!")
-    conn.close()
-
-def edit_brand(brand_id, new_name):
-    """Edit an existing brand in the database."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    try:
-        cursor.execute("UPDATE brands SET name = ? WHERE id = ?", (new_name, brand_id))
-        conn.commit()
-    except sqlite3.IntegrityError:
-        st.warning("Brand name already exists!")
-    conn.close()
-
-def delete_brand(brand_id):
-    """Delete a brand from the database."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM brands WHERE id = ?", (brand_id,))
-    conn.commit()
-    conn.close()
-
-# Initialize the database
-initialize_db()
+# Apply pending schema migrations (runs once per server process)
+ensure_schema()
 
 # Streamlit App
 st.set_page_config(layout="wide")
@@ -77,9 +24,11 @@ with colA:
     new_brand = st.text_input("Enter New Brand Name", key="new_brand")
     if st.button("Add Brand"):
         if new_brand.strip():
-            add_brand(new_brand.strip())
-            st.success(f"Brand '{new_brand}' added successfully!")
-            st.rerun()  # Refresh to update the brand list
+            if add_brand(new_brand.strip()):
+                st.success(f"Brand '{new_brand}' added successfully!")
+                st.rerun()  # Refresh to update the brand list
+            else:
+                st.warning("Brand already exists!")
         else:
             st.error("Brand name cannot be empty.")
 
@@ -89,15 +38,17 @@ with colB:
     if brand_options:
         brand_names = sorted([brand["name"] for brand in brand_options])
         selected_brand = st.selectbox("Select a Brand to Edit", options=brand_names, key="edit_brand_select")
-        brand_id = next(brand["id"] for brand in brand_options if brand["name"] == selected_brand)
+        brand_id = get_brand_by_name(selected_brand)["id"]
 
         # Input field to update the brand name
         updated_name = st.text_input("Enter New Name for Selected Brand", value=selected_brand, key="edit_brand_name")
         if st.button("Update Brand"):
             if updated_name.strip():
-                edit_brand(brand_id, updated_name.strip())
-                st.success(f"Brand '{selected_brand}' updated to '{updated_name}' successfully!")
-                st.rerun()  # Refresh to update the brand list
+                if edit_brand(brand_id, updated_name.strip()):
+                    st.success(f"Brand '{selected_brand}' updated to '{updated_name}' successfully!")
+                    st.rerun()  # Refresh to update the brand list
+                else:
+                    st.warning("Brand name already exists!")
             else:
                 st.error("Updated brand name cannot be empty.")
     else:
@@ -109,7 +60,7 @@ with colC:
     if brand_options:
         brand_names = sorted([brand["name"] for brand in brand_options])
         selected_delete_brand = st.selectbox("Select a Brand to Delete", options=brand_names, key="delete_brand_select")
-        delete_brand_id = next(brand["id"] for brand in brand_options if brand["name"] == selected_delete_brand)
+        delete_brand_id = get_brand_by_name(selected_delete_brand)["id"]
 
         if st.button("Delete Brand"):
             delete_brand(delete_brand_id)
@@ -1,117 +1,12 @@
-import sqlite3
 import streamlit as st
 
-# Database setup
-DB_PATH = "db.sqlite"
+from affinity_utils import MOTOR_SPEEDS
+from catalog_utils import get_brands, get_saved_models, get_model_by_number, save_fan_data, update_fan_data
+from schema_utils import ensure_schema
 
 
-def initialize_db():
-    """Create the fan_data and brands tables if they don't exist."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
-    # Table for brands
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS brands (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT UNIQUE NOT NULL
-        )
-    """)
-
-    # Table for fan data
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS fan_data (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            model_number TEXT UNIQUE NOT NULL,
-            model_number_group TEXT NOT NULL,
-            brand TEXT NOT NULL,
-            speed TEXT NOT NULL,
-            blade_angle TEXT NOT NULL,
-            drive_train TEXT NOT NULL
-        )
-    """)
-
-    conn.commit()
-    conn.close()
-
-
-def get_brands():
-    """Fetch all brand names from the database."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT name FROM brands")
-    brands = [{"name": row[0]} for row in cursor.fetchall()]
-    conn.close()
-    return brands
-
-
-def get_saved_models():
-    """Fetch all saved models from the database."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, model_number FROM fan_data")
-    models = [{"id": row[0], "model_number": row[1]} for row in cursor.fetchall()]
-    conn.close()
-    return models
-
-
-def get_model_details(model_id):
-    """Fetch details of a specific model by its ID."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("""
-        SELECT model_number, model_number_group, brand, speed, blade_angle, drive_train
-        FROM fan_data WHERE id = ?
-    """, (model_id,))
-    row = cursor.fetchone()
-    conn.close()
-    if row:
-        return {
-            "model_number": row[0],
-            "model_number_group": row[1],
-            "brand": row[2],
-            "speed": row[3],
-            "blade_angle": row[4],
-            "drive_train": row[5],
-        }
-    return None
-
-
-def save_fan_data(model_number, model_number_group, brand, speed, blade_angle, drive_train):
-    """Save a new fan model into the database."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT COUNT(*) FROM fan_data WHERE model_number = ?", (model_number,))
-    exists = cursor.fetchone()[0]
-
-    if exists:
-        st.warning(f"Model number '{model_number}' already exists. Please use a unique model number.")
-    else:
-        cursor.execute("""
-            INSERT INTO fan_data (model_number, model_number_group, brand, speed, blade_angle, drive_train)
-            VALUES (?, ?, ?, ?, ?, ?)
-        """, (model_number, model_number_group, brand, speed, blade_angle, drive_train))
-        conn.commit()
-        st.success(f"Model '{model_number}' saved successfully!")
-    conn.close()
-
-
-def update_fan_data(model_id, model_number, model_number_group, brand, speed, blade_angle, drive_train):
-    """Update an existing fan model in the database."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("""
-        UPDATE fan_data
-        SET model_number = ?, model_number_group = ?, brand = ?, speed = ?, blade_angle = ?, drive_train = ?
-        WHERE id = ?
-    """, (model_number, model_number_group, brand, speed, blade_angle, drive_train, model_id))
-    conn.commit()
-    st.success(f"Model '{model_number}' updated successfully!")
-    conn.close()
-
-
-# Initialize database
-initialize_db()
+# Apply pending schema migrations (runs once per server process)
+ensure_schema()
 
 # Initialize session state
 if "model_number_group" not in st.session_state:
@@ -142,8 +37,8 @@ selected_model = st.selectbox("Choose a Model", options=model_options, key="sele
 
 # Prefill fields if a model is selected
 if selected_model != "Add New Model":
-    selected_id = next(model["id"] for model in saved_models if model["model_number"] == selected_model)
-    model_details = get_model_details(selected_id)
+    model_details = get_model_by_number(selected_model)
+    selected_id = model_details["id"]
 
     st.session_state["model_number_group"] = model_details["model_number_group"]
     st.session_state["brand"] = model_details["brand"]
@@ -181,8 +76,8 @@ with colA:
     if drive_train == "Direct Drive":
         speed = st.selectbox(
             "Fan Impeller Speed",
-            ["720", "960", "1440", "2880"],
-            index=["720", "960", "1440", "2880"].index(st.session_state["speed"]),
+            [str(speed) for speed in MOTOR_SPEEDS],
+            index=[str(speed) for speed in MOTOR_SPEEDS].index(st.session_state["speed"]),
             key="speed"
         )
     else:
@@ -212,14 +107,20 @@ else:
 if st.button("Save Model"):
     if selected_model == "Add New Model":
         if model_number_group and brand != "Select a Brand" and speed and blade_angle:
-            save_fan_data(model_number, model_number_group, brand, speed, blade_angle, drive_train)
-            st.rerun()  # Refresh to update the dropdown list
+            if save_fan_data(model_number, model_number_group, brand, speed, blade_angle, drive_train):
+                st.success(f"Model '{model_number}' saved successfully!")
+                st.rerun()  # Refresh to update the dropdown list
+            else:
+                st.warning(f"Model number '{model_number}' already exists. Please use a unique model number.")
         else:
             st.error("All fields are required to save a new model!")
     else:
         if model_number_group and brand != "Select a Brand" and speed and blade_angle:
-            update_fan_data(selected_id, model_number, model_number_group, brand, speed, blade_angle, drive_train)
-            st.rerun()  # Refresh to update the dropdown list
+            if update_fan_data(selected_id, model_number, model_number_group, brand, speed, blade_angle, drive_train):
+                st.success(f"Model '{model_number}' updated successfully!")
+                st.rerun()  # Refresh to update the dropdown list
+            else:
+                st.warning(f"Model number '{model_number}' already exists. Please use a unique model number.")
         else:
             st.error("All fields are required to update the model!")
 
@@ -1,111 +1,19 @@
-import sqlite3
 import streamlit as st
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import io
-import json
-
-# Database setup
-DB_PATH = "db.sqlite"
-
-
-def initialize_db():
-    """Ensure the database schema is correct."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-
-    # Ensure fan_data table exists
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS fan_data (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            model_number TEXT UNIQUE NOT NULL,
-            brand TEXT NOT NULL,
-            speed TEXT NOT NULL,
-            blade_angle TEXT NOT NULL,
-            drive_train TEXT NOT NULL
-        )
-    """)
-
-    # Ensure performance_data table exists with the required columns
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS performance_data (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            fan_id INTEGER NOT NULL,
-            flow_pressure_data TEXT NOT NULL,
-            curve_image BLOB,
-            polynomial_function TEXT,
-            FOREIGN KEY (fan_id) REFERENCES fan_data (id) ON DELETE CASCADE
-        )
-    """)
-
-    # Check and add missing columns if necessary
-    try:
-        cursor.execute("SELECT curve_image FROM performance_data LIMIT 1")
-    except sqlite3.OperationalError:
-        cursor.execute("ALTER TABLE performance_data ADD COLUMN curve_image BLOB")
-
-    try:
-        cursor.execute("SELECT polynomial_function FROM performance_data LIMIT 1")
-    except sqlite3.OperationalError:
-        cursor.execute("ALTER TABLE performance_data ADD COLUMN polynomial_function TEXT")
-
-    conn.commit()
-    conn.close()
-
-
-def get_saved_models():
-    """Fetch all saved models from the database."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT id, model_number FROM fan_data")
-    models = [{"id": row[0], "model_number": row[1]} for row in cursor.fetchall()]
-    conn.close()
-    return models
-
-
-def get_performance_data(fan_id):
-    """Fetch performance data for a specific fan model."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    cursor.execute("SELECT flow_pressure_data FROM performance_data WHERE fan_id = ?", (fan_id,))
-    row = cursor.fetchone()
-    conn.close()
-    if row:
-        return json.loads(row[0])
-    return []
-
-
-def save_performance_data(fan_id, performance_data, curve_image=None, polynomial_function=None):
-    """Save performance data, curve image, and polynomial function into the database."""
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
-    serialized_data = json.dumps(performance_data)
-
-    # Check if performance data already exists for the fan
-    cursor.execute("SELECT COUNT(*) FROM performance_data WHERE fan_id = ?", (fan_id,))
-    exists = cursor.fetchone()[0]
-
-    if exists:
-        # Update existing data
-        cursor.execute("""
-            UPDATE performance_data
-            SET flow_pressure_data = ?, curve_image = ?, polynomial_function = ?
-            WHERE fan_id = ?
-        """, (serialized_data, curve_image, polynomial_function, fan_id))
-    else:
-        # Insert new data
-        cursor.execute("""
-            INSERT INTO performance_data (fan_id, flow_pressure_data, curve_image, polynomial_function)
-            VALUES (?, ?, ?, ?)
-        """, (fan_id, serialized_data, curve_image, polynomial_function))
 
-    conn.commit()
-    conn.close()
+from affinity_utils import MOTOR_SPEEDS, parse_speed
+from catalog_utils import get_saved_models, get_model_by_number
+from curve_utils import PointBuffer, load_curve, parse_points, save_performance_data
+from db_utils import get_connection
+from fit_utils import MAX_FIT_DEGREE, fit_curve, format_equation, save_fits
+from image_utils import collect_garbage
+from render_utils import affinity_chart_curves, pump_curve_chart, render_pump_curve
+from schema_utils import ensure_schema
 
 
-# Initialize database
-initialize_db()
+# Apply pending schema migrations (runs once per server process)
+ensure_schema()
 
 # Configure the page layout
 st.set_page_config(layout="wide")
@@ -113,94 +21,158 @@ st.set_page_config(layout="wide")
 # App Title
 st.title("Fan Performance Data Management")
 
-# Fetch saved models
-models = get_saved_models()
-
-if models:
-    # Dropdown to select a fan model
-    selected_model = st.selectbox(
-        "Select a Fan Model",
-        options=[model["model_number"] for model in models],
-        key="model_selector"
-    )
-    model_id = next((model["id"] for model in models if model["model_number"] == selected_model), None)
 
-    # Load existing data when a model is selected
-    if "performance_df" not in st.session_state or st.session_state.get("current_model") != selected_model:
-        existing_data = get_performance_data(model_id)
-        st.session_state["performance_df"] = pd.DataFrame(existing_data or [], columns=["flow_rate", "pressure"])
-        st.session_state["current_model"] = selected_model
+# =============================================================================#
+# Page sections
+# Each section is a fragment, so a widget inside it reruns only that section
+# and the sections nested in it: a degree change refits and redraws the plot
+# without reloading the model list or rebuilding the data table.
+
+@st.fragment
+def points_section(model):
+    """Point entry, paste box and editable table; reruns the curve section with the edited points."""
+    buffer = st.session_state["point_buffer"]
+    # Key of the table as drawn on the previous run; a new buffer for another model starts at the same version
+    editor_key = f"performance_data_editor_{model['id']}_{buffer.version}"
+
+    def fold_edits():
+        """Copy pending table edits into the buffer before it changes."""
+        delta = st.session_state.get(editor_key)
+        if delta and (delta["edited_rows"] or delta["added_rows"] or delta["deleted_rows"]):
+            edited = st.session_state["performance_edited"]
+            buffer.replace(edited["flow_rate"], edited["pressure"])
+        # The table is redrawn under the next buffer version's key, so this one's edits are spent
+        st.session_state.pop(editor_key, None)
+
+    def add_pasted():
+        """Add the pasted points and empty the paste box; runs before the rerun, while the box can be changed."""
+        try:
+            pasted_flow_rates, pasted_pressures = parse_points(st.session_state["pasted_points"])
+        except ValueError as error:
+            st.session_state["paste_message"] = ("warning", str(error))
+            return
+        fold_edits()
+        buffer.extend(pasted_flow_rates, pasted_pressures)
+        st.session_state["pasted_points"] = ""
+        st.session_state["paste_message"] = ("success", f"Added {len(pasted_flow_rates)} points.")
 
     # Input fields for adding new data
-    st.subheader(f"Add Performance Data for Model: {selected_model}")
+    st.subheader(f"Add Performance Data for Model: {model['model_number']}")
     col1, col2, col3 = st.columns([3, 3, 1])
     with col1:
         flow_rate = st.number_input("Flow Rate (m³/s)", step=0.1, key="new_flow")
     with col2:
         pressure = st.number_input("Pressure (Pa)", step=1.0, key="new_pressure")
     with col3:
+        # The table below is drawn after this, so the new point shows up without another rerun
         if st.button("Add", key="add_button"):
-            # Validate that at least one row exists
-            new_row = {"flow_rate": flow_rate, "pressure": pressure}
-            st.session_state["performance_df"] = pd.concat(
-                [st.session_state["performance_df"], pd.DataFrame([new_row])],
-                ignore_index=True,
-            )
-            st.rerun()
-
-    # Editable performance data table
+            fold_edits()
+            buffer.append(flow_rate, pressure)
+
+    # Paste many points at once, e.g. two columns copied from a spreadsheet
+    with st.expander("Paste Points"):
+        st.text_area("One flow rate and pressure pair per line", key="pasted_points")
+        st.button("Add Pasted Points", key="paste_button", on_click=add_pasted)
+        # Outcome of the last paste, set by the callback as ("success" or "warning", text) and shown once
+        message = st.session_state.pop("paste_message", None)
+        if message:
+            kind, text = message
+            getattr(st, kind)(text)
+
+    # Editable performance data table; a new key per model and buffer version starts it from the buffer's points,
+    # so after an Add in this run the table is drawn under the new version's key
     st.subheader("Performance Data Table")
     edited_df = st.data_editor(
-        st.session_state["performance_df"],
+        buffer.to_frame(),
         num_rows="dynamic",
         use_container_width=True,
-        key="performance_data_editor"
+        key=f"performance_data_editor_{model['id']}_{buffer.version}"
     )
 
-    # Update session state with edits
-    st.session_state["performance_df"] = edited_df
+    # Keep the edited table so the next Add can fold its edits into the buffer
+    st.session_state["performance_edited"] = edited_df
 
     # Plot the pump curve and best-fit polynomial
     if not edited_df.empty:
-        edited_df["flow_rate"] = pd.to_numeric(edited_df["flow_rate"], errors="coerce")
-        edited_df["pressure"] = pd.to_numeric(edited_df["pressure"], errors="coerce")
-        edited_df = edited_df.dropna(subset=["flow_rate", "pressure"])
+        edited_df = edited_df.apply(pd.to_numeric, errors="coerce").dropna(subset=["flow_rate", "pressure"])
 
         flow_rates = edited_df["flow_rate"].values
         pressures = edited_df["pressure"].values
 
         if len(flow_rates) > 1:
-            degree = st.slider("Polynomial Degree", 1, 7, 2, key="degree_slider")
-            coefficients = np.polyfit(flow_rates, pressures, degree)
-            polynomial = np.poly1d(coefficients)
-
-            # Generate best-fit curve
-            flow_range = np.linspace(flow_rates.min(), flow_rates.max(), 500)
-            fitted_pressures = polynomial(flow_range)
-
-            fig, ax = plt.subplots(figsize=(8, 6))
-            ax.scatter(flow_rates, pressures, color="blue", label="Data Points")
-            ax.plot(flow_range, fitted_pressures, color="red", label=f"Best-Fit Polynomial (Degree {degree})")
-            ax.set_title("Pump Curve")
-            ax.set_xlabel("Flow Rate (m³/s)")
-            ax.set_ylabel("Pressure (Pa)")
-            ax.legend()
-            ax.grid(True)
-
-            st.pyplot(fig)
-
-            equation = " + ".join([f"{coeff:.2f}x^{i}" for i, coeff in enumerate(coefficients[::-1])])
-            st.markdown(f"**Best-Fit Polynomial Equation:** {equation}")
-
-            # Save button
-            if st.button("Save Performance Data and Curve", key="save_button"):
-                buf = io.BytesIO()
-                fig.savefig(buf, format="png")
-                curve_image = buf.getvalue()
-                save_performance_data(model_id, edited_df.to_dict(orient="records"), curve_image, equation)
-                st.success("Performance data and curve saved successfully!")
+            curve_section(model, flow_rates, pressures)
         else:
             st.warning("At least two data points are required to plot the pump curve.")
+
+
+@st.fragment
+def curve_section(model, flow_rates, pressures):
+    """Degree and overlay controls, the fitted curve chart and the equation."""
+    # Automatic selection picks the degree that best predicts left-out points
+    degree = None
+    if not st.checkbox("Choose Degree Automatically", key="auto_degree"):
+        degree = st.slider("Polynomial Degree", 1, MAX_FIT_DEGREE, 2, key="degree_slider")
+    tested_speed = parse_speed(model["speed"])
+    overlay_speeds = []
+    if not np.isnan(tested_speed):
+        overlay_speeds = st.multiselect(
+            "Show Curve at Other Speeds (rpm)",
+            options=[speed for speed in MOTOR_SPEEDS if speed != tested_speed],
+            key="overlay_speeds",
+        )
+    fit = fit_curve(flow_rates, pressures, degree)
+
+    # Interactive charts are drawn in the browser from a small sampled payload;
+    # the server-rendered image is only needed for the image view and when saving
+    chart_mode = st.radio("Chart Mode", options=["Interactive", "Image"], horizontal=True, key="chart_mode")
+    if chart_mode == "Interactive":
+        curves = affinity_chart_curves(
+            f"Best-Fit Polynomial (Degree {fit['degree']})", fit["coefficients"],
+            fit["flow_min"], fit["flow_max"], overlay_speeds, tested_speed, flow_rates, pressures,
+        )
+        st.altair_chart(pump_curve_chart(curves), use_container_width=True)
+    else:
+        # Rendered once per (points, fit, overlays); repeat views come from the render cache
+        st.image(render_pump_curve(flow_rates, pressures, fit, overlay_speeds, tested_speed))
+
+    equation = format_equation(fit)
+    st.markdown(f"**Best-Fit Polynomial Equation:** {equation}")
+
+    save_section(model["id"], flow_rates, pressures, fit, overlay_speeds, tested_speed, equation)
+
+
+@st.fragment
+def save_section(model_id, flow_rates, pressures, fit, overlay_speeds, tested_speed, equation):
+    """Save button for the points, curve image and fit currently shown."""
+    if st.button("Save Performance Data and Curve", key="save_button"):
+        curve_image = render_pump_curve(flow_rates, pressures, fit, overlay_speeds, tested_speed)
+        # Points and fit commit together, so a failed save never leaves a fit of other points
+        with get_connection(write=True) as conn:
+            replaced = save_performance_data(model_id, flow_rates, pressures, curve_image, equation, conn=conn)
+            save_fits([{**fit, "fan_id": model_id}], conn=conn)
+        if replaced:
+            collect_garbage([replaced])
+        st.success("Performance data and curve saved successfully!")
+
+
+# Fetch saved models
+models = get_saved_models()
+
+if models:
+    # Dropdown to select a fan model; changing it reruns every section
+    selected_model = st.selectbox(
+        "Select a Fan Model",
+        options=[model["model_number"] for model in models],
+        key="model_selector"
+    )
+    model = get_model_by_number(selected_model)
+
+    # Load existing data into the session's point buffer when a model is selected
+    if "point_buffer" not in st.session_state or st.session_state.get("current_model") != selected_model:
+        st.session_state["point_buffer"] = PointBuffer(*(load_curve(model["id"]) or ((), ())))
+        st.session_state["current_model"] = selected_model
+
+    points_section(model)
 else:
     st.warning("No fan models available. Please add a fan model first.")
 
@@ -0,0 +1,125 @@
+import pandas as pd
+import streamlit as st
+
+from affinity_utils import MOTOR_SPEEDS
+from blade_angle_utils import select_blade_angles
+from catalog_utils import get_brands
+from schema_utils import ensure_schema
+from selection_utils import MAX_OVERSIZE, PRESSURE_TOLERANCE, select_fans, select_speed_fans
+
+
+# Apply pending schema migrations (runs once per server process)
+ensure_schema()
+
+# Configure the page layout
+st.set_page_config(layout="wide")
+
+# App Title
+st.title("Fan Selection")
+
+# Duty point inputs
+st.subheader("Required Duty Point")
+colA, colB, colC = st.columns(3)
+
+with colA:
+    flow_rate = st.number_input("Flow Rate (m³/s)", min_value=0.0, step=0.1, key="duty_flow")
+    pressure = st.number_input("Pressure (Pa)", min_value=0.0, step=1.0, key="duty_pressure")
+
+with colB:
+    pressure_tolerance = st.number_input(
+        "Allowed Pressure Shortfall (%)", min_value=0.0, max_value=100.0, value=PRESSURE_TOLERANCE * 100, step=1.0
+    ) / 100
+    max_oversize = st.number_input(
+        "Allowed Pressure Excess (%)", min_value=0.0, max_value=500.0, value=MAX_OVERSIZE * 100, step=1.0
+    ) / 100
+    flow_tolerance = st.number_input(
+        "Flow Range Tolerance (%)", min_value=0.0, max_value=100.0, value=0.0, step=1.0
+    ) / 100
+
+with colC:
+    brand_options = [brand["name"] for brand in get_brands()]
+    brand = st.selectbox("Brand", options=["All Brands"] + brand_options)
+    drive_train = st.selectbox("Drive Train", options=["All Drive Trains", "Direct Drive", "Belt Transmission"])
+
+# Fan speed: curves are moved to other speeds with the fan affinity laws
+speed_mode = st.radio(
+    "Fan Speed",
+    options=["Tested Speed", "Fixed Speed", "Variable Speed (Belt Drive)"],
+    horizontal=True,
+    key="speed_mode",
+)
+if speed_mode == "Fixed Speed":
+    # Direct-drive fans run at a motor speed; other speeds are covered by the variable speed mode
+    speed = st.selectbox("Impeller Speed (rpm)", options=MOTOR_SPEEDS, index=MOTOR_SPEEDS.index(1440))
+elif speed_mode == "Variable Speed (Belt Drive)":
+    min_speed, max_speed = st.slider("Impeller Speed Range (rpm)", 100, 5000, (500, 3000), step=10)
+
+brand_filter = None if brand == "All Brands" else brand
+drive_train_filter = None if drive_train == "All Drive Trains" else drive_train
+
+if flow_rate > 0 and pressure > 0 and speed_mode == "Variable Speed (Belt Drive)":
+    results = select_speed_fans(
+        flow_rate, pressure, min_speed, max_speed, brand=brand_filter, drive_train=drive_train_filter
+    )
+
+    st.subheader(f"Matching Fans ({len(results)})")
+    if results:
+        results_df = pd.DataFrame(results).drop(columns=["fan_id"]).rename(columns={
+            "model_number": "Model Number",
+            "brand": "Brand",
+            "drive_train": "Drive Train",
+            "tested_speed": "Tested Speed (rpm)",
+            "required_speed": "Required Speed (rpm)",
+        })
+        st.dataframe(results_df, use_container_width=True, hide_index=True)
+    else:
+        st.warning("No fan reaches the required duty point within the speed range.")
+elif flow_rate > 0 and pressure > 0:
+    results = select_fans(
+        flow_rate,
+        pressure,
+        pressure_tolerance=pressure_tolerance,
+        max_oversize=max_oversize,
+        flow_tolerance=flow_tolerance,
+        brand=brand_filter,
+        drive_train=drive_train_filter,
+        speed=speed if speed_mode == "Fixed Speed" else None,
+    )
+
+    st.subheader(f"Matching Fans ({len(results)})")
+    if results:
+        results_df = pd.DataFrame(results).drop(columns=["fan_id"])
+        results_df["margin"] = results_df["margin"] * 100
+        results_df = results_df.rename(columns={
+            "model_number": "Model Number",
+            "brand": "Brand",
+            "drive_train": "Drive Train",
+            "speed": "Speed (rpm)",
+            "pressure_at_duty": "Pressure at Duty (Pa)",
+            "margin": "Margin (%)",
+        })
+        st.dataframe(results_df, use_container_width=True, hide_index=True)
+    else:
+        st.warning("No fan curves pass through the required duty point.")
+
+    # Continuous blade angle: interpolate between the stored angles of each model group
+    if st.checkbox("Interpolate Blade Angle Within Model Groups", key="interpolate_angle"):
+        angle_results = select_blade_angles(
+            flow_rate,
+            pressure,
+            brand=brand_filter,
+            drive_train=drive_train_filter,
+            speed=speed if speed_mode == "Fixed Speed" else None,
+        )
+        st.subheader(f"Model Groups at Interpolated Blade Angle ({len(angle_results)})")
+        if angle_results:
+            angle_df = pd.DataFrame(angle_results).rename(columns={
+                "model_number_group": "Model Group",
+                "speed": "Speed (rpm)",
+                "blade_angle": "Blade Angle (°)",
+            })
+            st.dataframe(angle_df, use_container_width=True, hide_index=True)
+        else:
+            st.warning("No model group reaches the required duty point at any blade angle.")
+else:
+    st.info("Enter the required flow rate and pressure to search the fan catalog.")
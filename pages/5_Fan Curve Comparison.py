@@ -0,0 +1,53 @@
+import streamlit as st
+
+from catalog_utils import get_brands
+from comparison_utils import compare_curves, comparison_summary, find_fan_ids
+from fit_utils import load_fit_index
+from render_utils import comparison_chart, samples_per_curve
+from schema_utils import ensure_schema
+
+
+# Apply pending schema migrations (runs once per server process)
+ensure_schema()
+
+# Configure the page layout
+st.set_page_config(layout="wide")
+
+# App Title
+st.title("Fan Curve Comparison")
+
+# Only models with a fitted curve can be compared
+index = load_fit_index()
+
+if len(index["fan_id"]):
+    compare_by = st.radio("Compare", options=["Models", "Model Group", "Brand"], horizontal=True, key="compare_by")
+    if compare_by == "Models":
+        model_numbers = st.multiselect(
+            "Select Fan Models", options=sorted(index["model_number"]), key="compare_models"
+        )
+        fan_ids = find_fan_ids(model_numbers=model_numbers)
+    elif compare_by == "Model Group":
+        groups = sorted({group for group in index["model_number_group"] if group})
+        group = st.selectbox("Select a Model Group", options=groups, key="compare_group")
+        fan_ids = find_fan_ids(model_number_group=group) if group else []
+    else:
+        brand = st.selectbox("Select a Brand", options=[brand["name"] for brand in get_brands()], key="compare_brand")
+        fan_ids = find_fan_ids(brand=brand) if brand else []
+
+    show_points = st.checkbox("Show Measured Points", key="compare_points")
+
+    if fan_ids:
+        comparison = compare_curves(fan_ids, samples_per_curve(len(fan_ids)), include_points=show_points)
+        labels_by_id = dict(zip(comparison["fan_ids"].tolist(), comparison["labels"]))
+        points = {labels_by_id[fan_id]: curve for fan_id, curve in comparison["points"].items()}
+
+        st.subheader(f"Fitted Curves ({len(comparison['labels'])})")
+        st.altair_chart(
+            comparison_chart(comparison["labels"], comparison["flow_grid"], comparison["pressure"], points),
+            use_container_width=True,
+        )
+        st.dataframe(comparison_summary(comparison), use_container_width=True, hide_index=True)
+    else:
+        st.info("Select the fan models to compare.")
+else:
+    st.warning("No fitted fan curves available. Please save performance data for a fan model first.")
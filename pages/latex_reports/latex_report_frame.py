@@ -71,9 +71,20 @@ def document_setting():
     return doc
 
 
+# ===================================================================================================#
+# Issue Date
+def issue_date(kwargs, rev_table):
+    # The "issueDate" input, else the date of the latest revision, so the same inputs build the same document
+    if kwargs.get("issueDate"):
+        return kwargs["issueDate"]
+    if len(rev_table):
+        return rev_table[-1][5]
+    return date.today().strftime("%B %d, %Y")
+
+
 # ===================================================================================================#
 # Title Page Settings
-def title_page(doc, kwargs):
+def title_page(doc, kwargs, rev_table=()):
     docNumber = kwargs["docNumber"]
     LOGO_PATH = kwargs["LOGO_PATH"]
     designCompany = kwargs["designCompany"]
@@ -144,7 +155,7 @@ def title_page(doc, kwargs):
                           Command('textbf', 'Reg.:'), registration)
             table.add_row(Command('textbf', 'Contact Number:'), customerContactNumber,
                           Command('textbf', 'Phone:'), designCompanyPhone)
-            table.add_row(Command('textbf', 'Date:'), date.today().strftime("%B %d, %Y"),
+            table.add_row(Command('textbf', 'Date:'), issue_date(kwargs, rev_table),
                           Command('textbf', 'Address:'), designCompanyAddressA)
             table.add_row(Command('textbf', 'Revision:'), revision,
                           NoEscape(r"\makebox[1cm]{}"), designCompanyAddressB)
@@ -319,13 +330,9 @@ def images(doc, caption, image, size):
 # ===================================================================================================#
 # Standard Append Table to Document
 def table_X_l_l_l(doc, content):
-    with doc.create(Tabularx('X l l l')) as table:
-        table.add_hline()
-        table.add_row('Description', 'Symbol', 'Value', 'Units', mapper=[bold])
-        table.add_hline()
-        for idx, rw in content.iterrows():
-            table.add_row(idx, rw[0], rw[1], rw[2])
-    doc.append(NewLine())
+    header = [bold(name) for name in ('Description', 'Symbol', 'Value', 'Units')]
+    columns = [escape_column(content.index)] + [escape_column(content.iloc[:, i]) for i in range(3)]
+    table_longtable(doc, LONGTABLE_TEXT_COLUMN + ' l l l', header, columns)
 
 
 # ===================================================================================================#
@@ -362,34 +369,13 @@ def table_df(doc, df):
     # Convert the dataframe to a LaTeX table and add it to the section
     cols = df.columns
     no_cols = len(cols)
-    tab_col = 'c X'  # Set the desired column format, e.g., 'X' for equal-width columns
-    print(tab_col)
+    tab_col = 'c ' + LONGTABLE_TEXT_COLUMN  # Long tables need a fixed width for the text column
     for x in range(1, no_cols):
         tab_col += " l"
 
-    header = ["Item"]
-    with doc.create(Tabularx(tab_col)) as table:
-        # Add column headers
-        for col_name in df.columns:
-            header.append(col_name)
-        table.add_hline()
-        table.add_row(header)
-        table.add_hline()
-
-        row_counter = 1
-        for _, row in df.iterrows():
-            row_cont = [str(row_counter)+"."]
-            for col_name, value in row.items():
-                if col_name == "Symbol":
-                    # Use math mode for "Symbol" column content
-                    value_math = value
-                    row_cont.append(value_math)
-                else:
-                    row_cont.append(value)
-            row_counter += 1
-            table.add_row(row_cont)
-        table.add_hline()
-    doc.append(NewLine())
+    header = ["Item"] + list(escape_column(cols))
+    columns = [item_column(len(df))] + [escape_column(df[col_name]) for col_name in cols]
+    table_longtable(doc, tab_col, header, columns)
 
 
 # ===================================================================================================#
@@ -399,48 +385,20 @@ def table_df_list(doc, df):
     cols = df.columns
     no_cols = len(cols)
     if no_cols == 1:
-        tab_col = 'X'  # Set the desired column format, e.g., 'X' for equal-width columns
-        tab_col = 'c' + ' ' + tab_col
-
-        header = ["Item"]
-        with doc.create(Tabularx(tab_col)) as table:
-            # Add column headers
-            for col_name in df.columns:
-                header.append(col_name)
-            table.add_hline()
-            table.add_row(header)
-            table.add_hline()
-            row_counter = 1
-            for _, row in df.iterrows():
-                row_cont = [str(row_counter)+"."]
-                for col_name, value in row.items():
-                    if col_name == "Symbol":
-                        # Use math mode for "Symbol" column content
-                        value_math = value
-                        row_cont.append(value_math)
-                    else:
-                        row_cont.append(value)
-                row_counter += 1
-                table.add_row(row_cont)
-            table.add_hline()
-        doc.append(NewLine())
+        tab_col = 'c ' + LONGTABLE_TEXT_COLUMN
+
+        header = ["Item"] + list(escape_column(cols))
+        columns = [item_column(len(df)), escape_column(df[cols[0]])]
+        table_longtable(doc, tab_col, header, columns)
 
 
 # ===================================================================================================#
 # Append rows to table
 def table_dataframe_append(doc, dataFrame):
-    table_rows = []
-    for index, row in dataFrame.iterrows():
-        description = index
-        symbol = row['Variable']
-        value = row['Value']
-        units = row['Unit']
-
-        # create a row for the table
-        table_row = [description, symbol, value, units]
-
-        # add the row to the list of table rows
-        table_rows.append(table_row)
+    # Description from the index, then the Variable, Value and Unit columns
+    header = [bold(name) for name in ('Description', 'Symbol', 'Value', 'Units')]
+    columns = [escape_column(dataFrame.index)] + [escape_column(dataFrame[name]) for name in ('Variable', 'Value', 'Unit')]
+    table_longtable(doc, LONGTABLE_TEXT_COLUMN + ' l l l', header, columns)
 
 
 # ===================================================================================================#
@@ -521,7 +479,7 @@ def display_images_3(doc, image_list):
 
 # ============================================================================== #
 # Main Program
-def latex_report(doc_number, inputs_kwargs, rev_table, file_path, sections):
+def report_document(inputs_kwargs, rev_table, sections):
     # ----------------------------------------------------------------------------------------------------#
     # Document Settings
     doc = document_setting()
@@ -530,7 +488,7 @@ def latex_report(doc_number, inputs_kwargs, rev_table, file_path, sections):
     # Building the Document
     # Cover Page
     # Title page content
-    doc = title_page(doc, inputs_kwargs)
+    doc = title_page(doc, inputs_kwargs, rev_table)
     doc.append(NewPage())
 
     # ----------------------------------------------------------------------------------------------------#
@@ -689,18 +647,10 @@ def latex_report(doc_number, inputs_kwargs, rev_table, file_path, sections):
     #     '''
     # doc.append(NoEscape(table_landscape_4))
 
-    row_counter = 1
-    for _, row in df.iterrows():
-        row_cont = [str(row_counter) + "."]
-        for col_name, value in row.items():
-            value.replace('%', r'\%')
-            row_cont.append(value)
-        row_counter += 1
-        table_landscape_5 = fr'''
-            {{{row_cont[0]}}} & {{{row_cont[1]}}} & {{{row_cont[2]}}} & {{{row_cont[3]}}} \\
-            '''
-        doc.append(NoEscape(table_landscape_5))
-        doc.append(NoEscape(r'''\hline'''))
+    # Cells are LaTeX as written, apart from percent signs not already escaped; every row is followed by a rule
+    columns = [item_column(len(df))] + [df[col_name].reset_index(drop=True).fillna('').astype(str).str.replace(r'(?<!\\)%', r'\%', regex=True) for col_name in df.columns]
+    columns = ['{' + column + '}' for column in columns]
+    doc.append(NoEscape(longtable_rows(columns, row_end=r' \\ \hline')))
 
     table_landscape_6 = r'''
             \end{longtable}
@@ -751,18 +701,10 @@ def latex_report(doc_number, inputs_kwargs, rev_table, file_path, sections):
     #         '''
     # doc.append(NoEscape(table_landscape_4))
 
-    row_counter = 1
-    for _, row in df.iterrows():
-        row_cont = [str(row_counter) + "."]
-        for col_name, value in row.items():
-            value.replace('%', r'\%')
-            row_cont.append(value)
-        row_counter += 1
-        table_landscape_5 = fr'''
-                {{{row_cont[0]}}} & {{{row_cont[1]}}} & {{{row_cont[2]}}} & {{{row_cont[3]}}} & {{{row_cont[4]}}}\\
-                '''
-        doc.append(NoEscape(table_landscape_5))
-        doc.append(NoEscape(r'''\hline'''))
+    # Cells are LaTeX as written, apart from percent signs not already escaped; every row is followed by a rule
+    columns = [item_column(len(df))] + [df[col_name].reset_index(drop=True).fillna('').astype(str).str.replace(r'(?<!\\)%', r'\%', regex=True) for col_name in df.columns]
+    columns = ['{' + column + '}' for column in columns]
+    doc.append(NoEscape(longtable_rows(columns, row_end=r' \\ \hline')))
 
     table_landscape_6 = r'''
                 \end{longtable}
@@ -979,8 +921,12 @@ def latex_report(doc_number, inputs_kwargs, rev_table, file_path, sections):
     #
     #
 
-    # Generate the calculation document
+    return doc
+
 
+# ===================================================================================================#
+# Generate the calculation document
+def generate_document(doc, doc_number, file_path):
     calc_path = os.path.join(file_path, doc_number)
     try:
         doc.generate_pdf(calc_path, clean_tex=False)
@@ -991,6 +937,13 @@ def latex_report(doc_number, inputs_kwargs, rev_table, file_path, sections):
         print("Latex generation problem")
         print("Download the file and open Manual in MikTex")
 
+
+# ===================================================================================================#
+# Build and generate a report
+def latex_report(doc_number, inputs_kwargs, rev_table, file_path, sections):
+    doc = report_document(inputs_kwargs, rev_table, sections)
+    generate_document(doc, doc_number, file_path)
+
 # if __name__ == '__main__':
 #     print("jjjjjjjjjjjjjjjjjjjj")
 #     main()
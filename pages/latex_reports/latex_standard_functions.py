@@ -37,8 +37,33 @@ from pylatex.utils import rm_temp_dir, bold, italic, fix_filename, NoEscape
 from pylatex.utils import bold
 from pylatex.package import Package
 
+import numpy as np
+import pandas as pd
 import sympy as sp
 
+
+# LaTeX replacements for special characters in table cells, as pylatex escapes them
+LATEX_SPECIAL_CHARS = str.maketrans({
+    '&': r'\&',
+    '%': r'\%',
+    '$': r'\$',
+    '#': r'\#',
+    '_': r'\_',
+    '{': r'\{',
+    '}': r'\}',
+    '~': r'\textasciitilde{}',
+    '^': r'\^{}',
+    '\\': r'\textbackslash{}',
+    '\n': '\\newline%\n',
+    '-': r'{-}',
+    '\xA0': '~',
+    '[': r'{[}',
+    ']': r'{]}',
+})
+
+# Long tables cannot stretch an X column, so the description column gets this width
+LONGTABLE_TEXT_COLUMN = r'p{0.45\linewidth}'
+
 # ===================================================================================================#
 # Latex Symbols
 def lat_sym(symbol):
@@ -70,16 +95,53 @@ def images(doc, caption, image, size):
    
 
 
+# ===================================================================================================#
+# Long Tables
+# DataFrame tables are emitted as longtable LaTeX, which breaks across pages.
+# Cells are escaped and rows joined a whole column at a time, and the table
+# is appended as one raw LaTeX string rather than a pylatex object per cell.
+def escape_column(values):
+    # Escape a column of cell values the way pylatex escapes a single cell.
+    # NoEscape cells are already LaTeX and kept as they are; missing values become empty cells.
+    values = pd.Series(values, dtype=object).reset_index(drop=True)
+    text = values.fillna('').astype(str)
+    raw = values.map(lambda value: isinstance(value, NoEscape))
+    return text.str.translate(LATEX_SPECIAL_CHARS).where(~raw, text)
+
+
+def item_column(count):
+    # Row numbers "1.", "2.", ... for an Item column
+    return pd.Series(np.arange(1, count + 1)).astype(str) + "."
+
+
+def longtable_rows(columns, row_end=r' \\'):
+    # Join the rows into one string; columns are Series of LaTeX-ready cell text
+    return (columns[0].str.cat(columns[1:], sep=' & ') + row_end + '%\n').str.cat()
+
+
+def longtable(col_setting, header, columns):
+    # A longtable with the header repeated on every page and a rule at each page end
+    header_rows = '\\hline%\n' + ' & '.join(header) + ' \\\\%\n\\hline%\n'
+    return (
+        '\\begin{longtable}{' + col_setting + '}%\n'
+        + header_rows + '\\endfirsthead%\n'
+        + header_rows + '\\endhead%\n'
+        + '\\hline%\n\\endfoot%\n'
+        + longtable_rows(columns)
+        + '\\end{longtable}%\n'
+    )
+
+
+def table_longtable(doc, col_setting, header, columns):
+    doc.append(NoEscape(longtable(col_setting, header, columns)))
+
+
 # ===================================================================================================#
 # Standard Append Table to Document
 def table_X_l_l_l(doc, content):
-    with doc.create(Tabularx('X l l l')) as table:
-        table.add_hline()
-        table.add_row('Description', 'Symbol', 'Value', 'Units', mapper=[bold])
-        table.add_hline()
-        for idx, rw in content.iterrows():
-            table.add_row(idx, rw[0], rw[1], rw[2])
-    doc.append(NewLine())
+    header = [bold(name) for name in ('Description', 'Symbol', 'Value', 'Units')]
+    columns = [escape_column(content.index)] + [escape_column(content.iloc[:, i]) for i in range(3)]
+    table_longtable(doc, LONGTABLE_TEXT_COLUMN + ' l l l', header, columns)
 
 
 # ===================================================================================================#
@@ -141,52 +203,25 @@ def table_df(doc, df):
     # Convert the dataframe to a LaTeX table and add it to the section
     cols = df.columns
     no_cols = len(cols)
-    tab_col = 'X'  # Set the desired column format, e.g., 'X' for equal-width columns
+    tab_col = LONGTABLE_TEXT_COLUMN  # Long tables need a fixed width for the text column
 
     for x in range(1, no_cols):
         tab_col += " c"
 
-    header = []
-    with doc.create(Tabularx(tab_col)) as table:
-        # Add column headers
-        for col_name in df.columns:
-            header.append(col_name)
-        table.add_hline()
-        table.add_row(header)
-        table.add_hline()
-
-        for _, row in df.iterrows():
-            row_cont = []
-            for col_name, value in row.items():
-                if col_name == "Symbol":
-                    # Use math mode for "Symbol" column content
-                    value_math = value
-                    row_cont.append(value_math)
-                else:
-                    row_cont.append(value)
-            table.add_row(row_cont)
-        table.add_hline()
-    doc.append(NewLine())
-
-
-
+    columns = [escape_column(df[col_name]) for col_name in cols]
+    table_longtable(doc, tab_col, list(escape_column(cols)), columns)
 
 
+# ===================================================================================================#
+# Append rows to table
 def table_dataframe_append(doc, dataFrame):
-    table_rows = []
-    for index, row in dataFrame.iterrows():
-        description = index
-        symbol = row['Variable']
-        value = row['Value']
-        units = row['Unit']
-
-        # create a row for the table
-        table_row = [description, symbol, value, units]
-
-        # add the row to the list of table rows
-        table_rows.append(table_row)
+    # Description from the index, then the Variable, Value and Unit columns
+    header = [bold(name) for name in ('Description', 'Symbol', 'Value', 'Units')]
+    columns = [escape_column(dataFrame.index)] + [escape_column(dataFrame[name]) for name in ('Variable', 'Value', 'Unit')]
+    table_longtable(doc, LONGTABLE_TEXT_COLUMN + ' l l l', header, columns)
 
 
+# ===================================================================================================#
 # Standard Section Function
 def section_heading(doc, heading, content):
     doc.append(NoEscape(r'\newpage'))
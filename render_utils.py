@@ -0,0 +1,258 @@
+import hashlib
+import io
+import threading
+from collections import OrderedDict
+
+import altair as alt
+import numpy as np
+import pandas as pd
+import streamlit as st
+from matplotlib.figure import Figure
+
+from affinity_utils import scale_coefficients
+from fit_utils import evaluate_fits, fit_evaluator, stack_coefficients
+
+
+# Upper bound on the bytes held by the render cache
+RENDER_CACHE_MAX_BYTES = 64 * 1024 * 1024
+
+# Samples along the fitted curve
+CURVE_SAMPLES = 500
+
+# Total fitted-curve samples sent to the browser for one interactive chart
+CHART_POINT_BUDGET = 4000
+
+# Fewest samples per fitted curve on an interactive chart
+MIN_CHART_SAMPLES = 40
+
+# Default pump-curve figure style
+CURVE_STYLE = {
+    "figsize": (8, 6),
+    "format": "png",
+    "title": "Pump Curve",
+    "xlabel": "Flow Rate (m³/s)",
+    "ylabel": "Pressure (Pa)",
+    "point_color": "blue",
+    "curve_color": "red",
+}
+
+
+# =============================================================================#
+# Render cache
+# Rendered figures are kept as image bytes keyed by a hash of everything that
+# affects the picture, so a repeat view is a dictionary lookup and never
+# touches matplotlib.
+
+class RenderCache:
+    """Thread-safe LRU cache of rendered image bytes with a total size cap."""
+
+    def __init__(self, max_bytes=RENDER_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            data = self._items.get(key)
+            if data is not None:
+                self._items.move_to_end(key)
+            return data
+
+    def put(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._items:
+                self.size -= len(self._items.pop(key))
+            self._items[key] = data
+            self.size += len(data)
+            while self.size > self.max_bytes:
+                _, evicted = self._items.popitem(last=False)
+                self.size -= len(evicted)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+            self.size = 0
+
+
+@st.cache_resource(show_spinner=False)
+def get_render_cache():
+    """Return the render cache shared by every session."""
+    return RenderCache()
+
+
+def render_key(*parts):
+    """Hash arrays and plain values into a cache key."""
+    digest = hashlib.sha256()
+    for part in parts:
+        if isinstance(part, np.ndarray):
+            digest.update(str(part.dtype).encode())
+            digest.update(np.ascontiguousarray(part).tobytes())
+        else:
+            digest.update(repr(part).encode())
+        digest.update(b"|")
+    return digest.hexdigest()
+
+
+# =============================================================================#
+# Pump-curve figures
+
+def render_pump_curve(flow_rates, pressures, fit, overlay_speeds=(), tested_speed=None, style=None):
+    """Return image bytes for a pump curve, rendering only on a cache miss.
+
+    Draws the measured points, the fitted polynomial and, optionally, the
+    fitted curve moved to other speeds with the affinity laws.
+    """
+    style = {**CURVE_STYLE, **(style or {})}
+    flow_rates = np.asarray(flow_rates, dtype=float)
+    pressures = np.asarray(pressures, dtype=float)
+    coefficients = np.asarray(fit["coefficients"], dtype=float)
+    degree = fit["degree"]
+    key = render_key(flow_rates, pressures, coefficients, tuple(overlay_speeds), tested_speed, sorted(style.items()))
+
+    cache = get_render_cache()
+    image = cache.get(key)
+    if image is not None:
+        return image
+
+    flow_range = np.linspace(fit["flow_min"], fit["flow_max"], CURVE_SAMPLES)
+    fitted_pressures = fit_evaluator(fit)(flow_range)
+
+    # A bare Figure keeps no global pyplot state, so nothing needs closing
+    fig = Figure(figsize=style["figsize"])
+    ax = fig.subplots()
+    ax.scatter(flow_rates, pressures, color=style["point_color"], label="Data Points")
+    ax.plot(flow_range, fitted_pressures, color=style["curve_color"], label=f"Best-Fit Polynomial (Degree {degree})")
+
+    # Affinity-law curves: flow scales with speed and pressure with speed squared
+    if overlay_speeds and tested_speed:
+        ratios = np.array(overlay_speeds, dtype=float) / tested_speed
+        scaled_flows = flow_range * ratios[:, None]
+        scaled_pressures = fitted_pressures * ratios[:, None] ** 2
+        for speed, scaled_flow, scaled_pressure in zip(overlay_speeds, scaled_flows, scaled_pressures):
+            ax.plot(scaled_flow, scaled_pressure, linestyle="--", label=f"{speed} rpm (Affinity Laws)")
+
+    ax.set_title(style["title"])
+    ax.set_xlabel(style["xlabel"])
+    ax.set_ylabel(style["ylabel"])
+    ax.legend()
+    ax.grid(True)
+
+    buf = io.BytesIO()
+    fig.savefig(buf, format=style["format"])
+    image = buf.getvalue()
+    cache.put(key, image)
+    return image
+
+
+# =============================================================================#
+# Interactive charts
+# Client-rendered Altair charts: the server only sends fitted-curve samples
+# and measured points as compact float32 columns, and the browser draws them.
+# The number of samples per curve shrinks as more curves are overlaid so the
+# payload stays within CHART_POINT_BUDGET.
+
+def samples_per_curve(curve_count):
+    """Return how many samples to draw per fitted curve when overlaying curve_count curves."""
+    return int(np.clip(CHART_POINT_BUDGET // max(curve_count, 1), MIN_CHART_SAMPLES, CURVE_SAMPLES))
+
+
+def curve_chart_data(curves):
+    """Build long-form chart data for one or more curves.
+
+    ``curves`` is a list of dicts with ``label``, ``coefficients``, ``flow_min``
+    and ``flow_max``, plus optional measured ``flow_rates`` and ``pressures``.
+    Returns ``(fitted, points)`` DataFrames.
+    """
+    samples = samples_per_curve(len(curves))
+    steps = np.linspace(0.0, 1.0, samples)
+
+    labels = [curve["label"] for curve in curves]
+    flow_min = np.array([curve["flow_min"] for curve in curves], dtype=float)
+    flow_max = np.array([curve["flow_max"] for curve in curves], dtype=float)
+    coefficients = stack_coefficients([curve["coefficients"] for curve in curves])
+
+    flow_grid = flow_min[:, None] + (flow_max - flow_min)[:, None] * steps
+    fitted_pressures = evaluate_fits(coefficients, flow_min, flow_max, flow_grid)
+    fitted = pd.DataFrame({
+        "curve": np.repeat(labels, samples),
+        "flow_rate": flow_grid.ravel().astype(np.float32),
+        "pressure": fitted_pressures.ravel().astype(np.float32),
+    })
+
+    measured = [curve for curve in curves if curve.get("flow_rates") is not None]
+    points = pd.DataFrame({
+        "curve": [curve["label"] for curve in measured for _ in curve["flow_rates"]],
+        "flow_rate": np.concatenate([np.asarray(curve["flow_rates"], dtype=np.float32) for curve in measured] or [[]]),
+        "pressure": np.concatenate([np.asarray(curve["pressures"], dtype=np.float32) for curve in measured] or [[]]),
+    })
+    return fitted, points
+
+
+def affinity_chart_curves(label, coefficients, flow_min, flow_max, overlay_speeds=(), tested_speed=None,
+                          flow_rates=None, pressures=None):
+    """Return chart curves for a fitted curve, its measured points and its affinity-law overlays."""
+    coefficients = np.asarray(coefficients, dtype=float)
+    curves = [{
+        "label": label,
+        "coefficients": coefficients,
+        "flow_min": flow_min,
+        "flow_max": flow_max,
+        "flow_rates": flow_rates,
+        "pressures": pressures,
+    }]
+    if overlay_speeds and tested_speed:
+        ratios = np.array(overlay_speeds, dtype=float) / tested_speed
+        for speed, ratio, scaled in zip(overlay_speeds, ratios, scale_coefficients(coefficients, ratios)):
+            curves.append({
+                "label": f"{speed} rpm (Affinity Laws)",
+                "coefficients": scaled,
+                "flow_min": flow_min * ratio,
+                "flow_max": flow_max * ratio,
+            })
+    return curves
+
+
+def _layered_chart(fitted, points, style=None):
+    """Layer fitted lines and measured points from long-form chart data."""
+    style = {**CURVE_STYLE, **(style or {})}
+    x = alt.X("flow_rate:Q", title=style["xlabel"])
+    y = alt.Y("pressure:Q", title=style["ylabel"])
+    color = alt.Color("curve:N", title=None)
+    tooltip = ["curve", "flow_rate", "pressure"]
+
+    layers = [alt.Chart(fitted).mark_line().encode(x=x, y=y, color=color, tooltip=tooltip)]
+    if not points.empty:
+        layers.append(alt.Chart(points).mark_point(filled=True).encode(x=x, y=y, color=color, tooltip=tooltip))
+    return alt.layer(*layers).properties(title=style["title"]).interactive()
+
+
+def pump_curve_chart(curves, style=None):
+    """Return an interactive Altair chart of fitted curves and measured points."""
+    fitted, points = curve_chart_data(curves)
+    return _layered_chart(fitted, points, style)
+
+
+def comparison_chart(labels, flow_grid, pressure, points=None, style=None):
+    """Return an interactive chart of curves already sampled on a shared flow grid.
+
+    ``pressure`` has one row per label; NaN samples (outside a curve's fitted
+    range) are left out of the payload. ``points`` optionally holds measured
+    ``(flow_rates, pressures)`` per label.
+    """
+    inside = ~np.isnan(pressure)
+    fitted = pd.DataFrame({
+        "curve": np.repeat(np.asarray(labels, dtype=object), inside.sum(axis=1)),
+        "flow_rate": np.broadcast_to(flow_grid, pressure.shape)[inside].astype(np.float32),
+        "pressure": pressure[inside].astype(np.float32),
+    })
+    points = points or {}
+    measured = [(label, points[label]) for label in labels if label in points]
+    points = pd.DataFrame({
+        "curve": [label for label, (flow_rates, _) in measured for _ in flow_rates],
+        "flow_rate": np.concatenate([np.asarray(curve[0], dtype=np.float32) for _, curve in measured] or [[]]),
+        "pressure": np.concatenate([np.asarray(curve[1], dtype=np.float32) for _, curve in measured] or [[]]),
+    })
+    return _layered_chart(fitted, points, {"title": "Fan Curve Comparison", **(style or {})})
@@ -0,0 +1,481 @@
+import functools
+import hashlib
+import json
+import os
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+
+if os.name == "nt":
+    import msvcrt
+else:
+    import fcntl
+
+import pandas as pd
+
+import db_utils
+
+
+# Folder holding the LaTeX report frame; its modules import each other by bare name
+REPORTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "pages", "latex_reports")
+
+# Worker processes compiling reports in a batch; None uses every core
+REPORT_WORKERS = None
+
+# PDF build cache folder, next to the database like the curve image store
+REPORT_CACHE_DIR = "report_cache"
+
+# Bytes of cached PDFs kept on disk; the least recently used are evicted beyond this
+REPORT_CACHE_BYTES = 512 * 1024 * 1024
+
+# Seconds a build folder or preamble format may go unused before it is deleted
+REPORT_BUILD_MAX_AGE = 30 * 24 * 60 * 60
+
+# pdflatex passes allowed per build before giving up on the auxiliary files settling
+LATEX_MAX_PASSES = 5
+
+# Auxiliary files whose changes between passes mean another pass is needed
+LATEX_AUX_SUFFIXES = (".aux", ".toc", ".lof", ".lot", ".out")
+
+# Log messages from packages that ask for another pass
+LATEX_RERUN_MARKERS = (b"Rerun to get", b"Rerun LaTeX", b"Label(s) may have changed")
+
+# Compile reports against a precompiled format of the fixed document_setting() preamble
+USE_PREAMBLE_FORMAT = True
+
+# pdflatex job name inside a build folder; the folder, not the job, identifies the report
+BUILD_JOBNAME = "report"
+
+# Lock file held while a build folder is in use
+BUILD_LOCK_NAME = ".lock"
+
+# Subsection content kinds whose value is a table given as a list of records
+TABLE_KINDS = ("df", "df_list")
+
+
+# =============================================================================#
+# Report specifications
+# A report is described by a JSON file:
+#
+#   {
+#     "doc_number": "...",
+#     "inputs": {...title page and header fields, optionally "issueDate"...},
+#     "rev_table": [[rev, description, originator, reviewed, engineer, date], ...],
+#     "sections": {"section_1": [heading, sub_heading, [[kind, value, ...], ...]], ...}
+#   }
+#
+# Table content ("df", "df_list") is written as a list of records and turned
+# into the DataFrames latex_report expects. The title page shows "issueDate",
+# or the date of the last rev_table row, so a report's source only changes
+# when its spec does.
+
+def load_report_spec(path):
+    """Read a report specification file into latex_report arguments."""
+    with open(path, encoding="utf-8") as file:
+        spec = json.load(file)
+
+    sections = {}
+    for name, (heading, sub_heading, contents) in spec["sections"].items():
+        contents = [
+            [kind, pd.DataFrame.from_records(value), *rest] if kind in TABLE_KINDS else [kind, value, *rest]
+            for kind, value, *rest in contents
+        ]
+        sections[name] = [heading, sub_heading, contents]
+
+    return {
+        "doc_number": spec["doc_number"],
+        "inputs_kwargs": spec["inputs"],
+        "rev_table": spec.get("rev_table", []),
+        "sections": sections,
+    }
+
+
+# =============================================================================#
+# PDF build cache
+# A report's PDF depends only on its LaTeX source and the images it includes,
+# so built PDFs are kept under the SHA-256 of the .tex text plus the bytes of
+# every referenced image (the title-page logo and "img" contents). A report
+# whose digest is already cached is copied instead of compiled. Entries are
+# written atomically, so concurrent builds can share the cache, and reads
+# refresh an entry's mtime so eviction drops the least recently used first.
+# Build folders and preamble formats are not counted against the size limit;
+# they are deleted once unused for REPORT_BUILD_MAX_AGE.
+
+def get_report_cache_path():
+    """Return the PDF cache directory for the current database."""
+    return os.path.join(os.path.dirname(os.path.abspath(db_utils.DB_PATH)), REPORT_CACHE_DIR)
+
+
+def report_image_paths(spec):
+    """List the image files a report includes."""
+    paths = [spec["inputs_kwargs"]["LOGO_PATH"]]
+    for _, _, contents in spec["sections"].values():
+        paths.extend(value for kind, value, *_ in contents if kind == "img")
+    return paths
+
+
+def report_digest(tex, image_paths):
+    """Hash a report's LaTeX source and the bytes of its images."""
+    digest = hashlib.sha256(tex.encode())
+    for path in image_paths:
+        digest.update(b"|" + path.encode() + b"|")
+        try:
+            with open(path, "rb") as image:
+                for block in iter(lambda: image.read(1 << 20), b""):
+                    digest.update(block)
+        except OSError:
+            # A missing image fails the build; still key it apart from a present one
+            digest.update(b"missing")
+    return digest.hexdigest()
+
+
+def cached_report_path(digest):
+    """Return the cache path for a report digest."""
+    return os.path.join(get_report_cache_path(), digest + ".pdf")
+
+
+def fetch_cached_report(digest, pdf_path):
+    """Copy a cached PDF to pdf_path; returns False on a miss."""
+    cached = cached_report_path(digest)
+    try:
+        shutil.copyfile(cached, pdf_path)
+        os.utime(cached)
+    except FileNotFoundError:
+        return False
+    return True
+
+
+def store_cached_report(digest, pdf_path, max_bytes=REPORT_CACHE_BYTES):
+    """Add a built PDF to the cache, then evict the least recently used entries beyond max_bytes."""
+    cache_dir = get_report_cache_path()
+    os.makedirs(cache_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix=".tmp")
+    os.close(fd)
+    try:
+        shutil.copyfile(pdf_path, tmp_path)
+        os.replace(tmp_path, cached_report_path(digest))
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    evict_cached_reports(max_bytes)
+    prune_report_builds()
+
+
+def evict_cached_reports(max_bytes=REPORT_CACHE_BYTES):
+    """Delete the least recently used cached PDFs until the cache fits in max_bytes; returns the count removed."""
+    entries = []
+    with os.scandir(get_report_cache_path()) as scan:
+        for entry in scan:
+            if entry.name.endswith(".pdf"):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for _, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(path)
+            removed += 1
+        except FileNotFoundError:
+            pass
+        total -= size
+    return removed
+
+
+def prune_report_builds(max_age=REPORT_BUILD_MAX_AGE):
+    """Delete build folders and preamble formats unused for max_age seconds; returns the count removed.
+
+    A build rewrites its folder's .tex and a compile touches its format, so
+    their modification times record when each was last used.
+    """
+    cutoff = time.time() - max_age
+    cache_dir = get_report_cache_path()
+    removed = 0
+    for kind in ("builds", "formats"):
+        try:
+            scan = os.scandir(os.path.join(cache_dir, kind))
+        except FileNotFoundError:
+            continue
+        with scan:
+            for entry in scan:
+                path = os.path.join(entry.path, BUILD_JOBNAME + ".tex") if entry.is_dir() else entry.path
+                try:
+                    if os.path.getmtime(path) >= cutoff:
+                        continue
+                except FileNotFoundError:
+                    # A folder without its .tex never finished a build; go by the folder itself
+                    if os.path.getmtime(entry.path) >= cutoff:
+                        continue
+                if entry.is_dir():
+                    shutil.rmtree(entry.path, ignore_errors=True)
+                else:
+                    try:
+                        os.remove(entry.path)
+                    except OSError:
+                        continue
+                removed += 1
+    return removed
+
+
+# =============================================================================#
+# Precompiled preamble
+# Loading the packages of document_setting() dominates pdflatex time for
+# short reports, so that preamble is dumped once into a pdflatex format file
+# and every pass starts from it. The format sets \documentclass to a no-op
+# and the packages it holds are already loaded, so report .tex files stay
+# unchanged and still compile without it. Formats are kept in the report
+# cache, named by a hash of the preamble text and the pdflatex version, so
+# editing document_setting() or upgrading TeX builds a new one.
+
+@functools.lru_cache(maxsize=1)
+def _pdflatex_version():
+    """Return the first line of ``pdflatex --version``, or None if pdflatex is missing."""
+    try:
+        output = subprocess.run(["pdflatex", "--version"], capture_output=True, text=True, check=True).stdout
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    return output.splitlines()[0]
+
+
+def preamble_format(frame):
+    """Return the format file for the current document_setting() preamble, building it if needed.
+
+    Returns None when pdflatex is unavailable or the format cannot be built.
+    """
+    version = _pdflatex_version()
+    if version is None:
+        return None
+    preamble = frame.document_setting().dumps().split(r"\begin{document}")[0]
+    digest = hashlib.sha256((version + "|" + preamble).encode()).hexdigest()[:16]
+    format_dir = os.path.join(get_report_cache_path(), "formats")
+    format_path = os.path.join(format_dir, f"preamble-{digest}.fmt")
+    try:
+        # Mark the format as in use so prune_report_builds keeps it
+        os.utime(format_path)
+        return format_path
+    except FileNotFoundError:
+        pass
+
+    os.makedirs(format_dir, exist_ok=True)
+    with tempfile.TemporaryDirectory(prefix="preamble-") as build_dir:
+        with open(os.path.join(build_dir, "preamble.tex"), "w", encoding="utf-8") as tex:
+            tex.write(preamble)
+            tex.write("\n" + r"\renewcommand\documentclass[2][]{}" + "\n" + r"\dump" + "\n")
+        result = subprocess.run(
+            ["pdflatex", "-ini", "-interaction=nonstopmode", "-jobname=preamble", "&pdflatex", "preamble.tex"],
+            cwd=build_dir, capture_output=True,
+        )
+        built = os.path.join(build_dir, "preamble.fmt")
+        if result.returncode or not os.path.exists(built):
+            return None
+        # Concurrent builders produce the same file; the last replace wins harmlessly
+        staged = f"{format_path}.{os.getpid()}.tmp"
+        shutil.move(built, staged)
+        os.replace(staged, format_path)
+    return format_path
+
+
+# =============================================================================#
+# Incremental builds
+# Each report is built in its own folder under report_cache/builds, kept
+# between builds, so the folder keeps the .aux and .toc of the last build.
+# pdflatex is rerun only while those auxiliary files still change: a first
+# build takes the usual three passes, a rebuild where only body text changed
+# takes one. Folders are per document and named from a hash of the doc
+# number, so any doc number makes a safe folder name. A build holds an
+# exclusive lock on its folder, so two processes building the same report
+# take turns instead of sharing auxiliary files.
+
+def _latex_report_frame():
+    """Import the report frame, whose modules import each other by bare name."""
+    if REPORTS_DIR not in sys.path:
+        sys.path.append(REPORTS_DIR)
+    import latex_report_frame
+    return latex_report_frame
+
+
+def report_file_name(doc_number):
+    """Return a doc number with characters unsafe in file names replaced."""
+    return re.sub(r"[^A-Za-z0-9._-]", "_", doc_number)
+
+
+def report_build_path(doc_number):
+    """Return the persistent build folder of a report.
+
+    The name is the sanitised doc number, for readability, plus a hash of
+    the doc number that keeps it unique.
+    """
+    digest = hashlib.sha256(doc_number.encode()).hexdigest()[:12]
+    return os.path.join(get_report_cache_path(), "builds", f"{report_file_name(doc_number)[:40]}-{digest}")
+
+
+def report_log_path(doc_number):
+    """Return the pdflatex log of a report's last build."""
+    return os.path.join(report_build_path(doc_number), BUILD_JOBNAME + ".log")
+
+
+@contextmanager
+def build_lock(build_dir):
+    """Hold an exclusive lock on a build folder, waiting while another process builds in it."""
+    os.makedirs(build_dir, exist_ok=True)
+    with open(os.path.join(build_dir, BUILD_LOCK_NAME), "a+b") as lock:
+        if os.name == "nt":
+            lock.seek(0)
+            while True:
+                try:
+                    # LK_LOCK gives up after about ten seconds; keep waiting
+                    msvcrt.locking(lock.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    pass
+        else:
+            fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if os.name == "nt":
+                lock.seek(0)
+                msvcrt.locking(lock.fileno(), msvcrt.LK_UNLCK, 1)
+            else:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_UN)
+
+
+def _aux_state(build_dir, jobname):
+    """Hash the auxiliary files of a build, None for those not written."""
+    state = []
+    for suffix in LATEX_AUX_SUFFIXES:
+        try:
+            with open(os.path.join(build_dir, jobname + suffix), "rb") as aux:
+                state.append(hashlib.sha256(aux.read()).digest())
+        except FileNotFoundError:
+            state.append(None)
+    return state
+
+
+def run_latex(build_dir, jobname, format_path=None, max_passes=LATEX_MAX_PASSES):
+    """Run pdflatex until the auxiliary files stop changing; returns the passes run, or None on a LaTeX error.
+
+    Image paths are also looked up relative to the current directory, as
+    they were when reports were compiled in place.
+    """
+    command = ["pdflatex", "-interaction=nonstopmode", "-halt-on-error"]
+    if format_path:
+        command.append(f"-fmt={format_path}")
+    command.append(jobname + ".tex")
+    env = {**os.environ, "TEXINPUTS": os.pathsep.join([".", os.getcwd(), ""])}
+
+    for passes in range(1, max_passes + 1):
+        before = _aux_state(build_dir, jobname)
+        try:
+            result = subprocess.run(command, cwd=build_dir, env=env, capture_output=True)
+        except OSError:
+            return None
+        if result.returncode:
+            # A failed pass can leave truncated auxiliary files; start the next build clean
+            for suffix in LATEX_AUX_SUFFIXES:
+                if os.path.exists(os.path.join(build_dir, jobname + suffix)):
+                    os.remove(os.path.join(build_dir, jobname + suffix))
+            return None
+        if _aux_state(build_dir, jobname) == before and not any(
+            marker in result.stdout for marker in LATEX_RERUN_MARKERS
+        ):
+            break
+    return passes
+
+
+# =============================================================================#
+# Report generation
+
+def generate_report(spec, output_dir, use_cache=True, use_format=USE_PREAMBLE_FORMAT):
+    """Build a report PDF and its .tex in output_dir; returns the PDF path, or None if LaTeX failed.
+
+    The output files are named by the sanitised doc number; on a LaTeX
+    failure the log is left at report_log_path(doc_number). Unless ``use_cache`` is False, an unchanged report is copied from the PDF
+    build cache instead of being compiled. With ``use_format`` it is
+    compiled against the precompiled preamble when one can be built.
+    """
+    frame = _latex_report_frame()
+    os.makedirs(output_dir, exist_ok=True)
+    doc_number = spec["doc_number"]
+    output_path = os.path.join(output_dir, report_file_name(doc_number))
+    pdf_path = output_path + ".pdf"
+
+    doc = frame.report_document(spec["inputs_kwargs"], spec["rev_table"], spec["sections"])
+    tex = doc.dumps()
+    # The output .tex is the whole document in one file, so it can be opened and built by hand
+    with open(output_path + ".tex", "w", encoding="utf-8") as tex_file:
+        tex_file.write(tex)
+    digest = report_digest(tex, report_image_paths(spec))
+    if use_cache and fetch_cached_report(digest, pdf_path):
+        return pdf_path
+
+    format_path = preamble_format(frame) if use_format else None
+    build_dir = report_build_path(doc_number)
+    with build_lock(build_dir):
+        with open(os.path.join(build_dir, BUILD_JOBNAME + ".tex"), "w", encoding="utf-8") as tex_file:
+            tex_file.write(tex)
+        if run_latex(build_dir, BUILD_JOBNAME, format_path) is None:
+            return None
+
+        built_pdf = os.path.join(build_dir, BUILD_JOBNAME + ".pdf")
+        if use_cache:
+            store_cached_report(digest, built_pdf)
+        shutil.move(built_pdf, pdf_path)
+    return pdf_path
+
+
+def _report_job(spec, output_dir, use_cache=True, use_format=USE_PREAMBLE_FORMAT):
+    """Build one report in a worker process and describe the outcome."""
+    start = time.perf_counter()
+    result = {"doc_number": spec["doc_number"], "pdf_path": None, "error": None}
+    try:
+        result["pdf_path"] = generate_report(spec, output_dir, use_cache, use_format)
+        if result["pdf_path"] is None:
+            result["error"] = f"LaTeX generation failed, see {report_log_path(spec['doc_number'])}"
+    except Exception as error:
+        result["error"] = f"{type(error).__name__}: {error}"
+    result["seconds"] = time.perf_counter() - start
+    return result
+
+
+def generate_reports(specs, output_dir, workers=REPORT_WORKERS, use_cache=True, use_format=USE_PREAMBLE_FORMAT):
+    """Build many reports in parallel worker processes.
+
+    ``specs`` are report specifications as returned by load_report_spec.
+    Returns one result dict per spec, in order, with ``doc_number``,
+    ``pdf_path`` (None on failure), ``error`` (naming the pdflatex log when
+    LaTeX fails) and ``seconds``. A failing
+    report does not stop the others. Reports unchanged since they were
+    last built come from the PDF build cache unless ``use_cache`` is False;
+    ``use_format`` compiles against the precompiled preamble.
+    """
+    specs = list(specs)
+    # Doc numbers that differ only in unsafe characters share output files
+    names = [report_file_name(spec["doc_number"]) for spec in specs]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"Reports would overwrite each other: {', '.join(duplicates)}")
+    if len(specs) <= 1 or workers == 1:
+        return [_report_job(spec, output_dir, use_cache, use_format) for spec in specs]
+
+    # Build the format once here rather than in every worker
+    if use_format:
+        preamble_format(_latex_report_frame())
+    # Spawned workers re-import db_utils, so point them at this process's database and its report cache
+    with ProcessPoolExecutor(
+        max_workers=workers, initializer=db_utils.set_db_path, initargs=(db_utils.DB_PATH,)
+    ) as pool:
+        return list(pool.map(
+            _report_job, specs, [output_dir] * len(specs), [use_cache] * len(specs), [use_format] * len(specs)
+        ))
@@ -0,0 +1,511 @@
+import hashlib
+import json
+import struct
+import threading
+from datetime import datetime
+
+import numpy as np
+
+from curve_utils import records_to_curve, unpack_curve
+from db_utils import get_connection
+from fit_utils import pack_coefficients, unpack_coefficients
+from image_utils import store_image
+
+
+# Tables whose in-memory caches are checked against catalog_version
+CATALOG_TABLES = ("brands", "fan_data", "curve_fits")
+
+
+# =============================================================================#
+# Migration steps
+# Each step runs inside the same transaction that records it in schema_version,
+# so a failed step leaves the database at the previous version. A step must
+# do today what it did when it was first applied, so the fitting, equation
+# format and point digest used by steps 5 to 8 are copied here as they were
+# rather than taken from fit_utils and curve_utils, which keep changing.
+
+# Degree given by step 5 to curves with no saved equation
+MIGRATION_FIT_DEGREE = 2
+
+# Flow samples step 6 evaluates each fit at to find its pressure envelope
+MIGRATION_ENVELOPE_SAMPLES = 64
+
+# Largest change in fitted pressure, relative to the curve's pressure range,
+# that step 7 treats as the same fit and leaves the saved equation alone
+REFIT_TOLERANCE = 1e-6
+
+# Basis of the step 7 fits, as recorded by step 8
+MIGRATION_FIT_BASIS = "unit_power"
+
+# Slope samples across [-1, 1] and iteration cap of the step 7 decreasing fit
+MIGRATION_MONOTONE_SAMPLES = 64
+MIGRATION_MONOTONE_MAX_ITERATIONS = 200
+
+
+def _create_base_tables(cursor):
+    """Create every table the app uses, with the canonical fan_data layout."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS users (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            username TEXT NOT NULL,
+            password TEXT NOT NULL
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS worksorders (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            projectNumber TEXT UNIQUE NOT NULL,
+            customerCompanyName TEXT NOT NULL,
+            projectName TEXT NOT NULL,
+            projectDirectory TEXT NOT NULL,
+            status TEXT
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS resources (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            firstName TEXT NOT NULL,
+            lastName TEXT NOT NULL,
+            birthday TEXT NOT NULL
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS brands (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT UNIQUE NOT NULL
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS fan_data (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            model_number TEXT UNIQUE NOT NULL,
+            model_number_group TEXT NOT NULL,
+            brand TEXT NOT NULL,
+            speed TEXT NOT NULL,
+            blade_angle TEXT NOT NULL,
+            drive_train TEXT NOT NULL
+        )
+    """)
+
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS performance_data (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            fan_id INTEGER NOT NULL,
+            flow_pressure_data TEXT NOT NULL,
+            curve_image BLOB,
+            polynomial_function TEXT,
+            FOREIGN KEY (fan_id) REFERENCES fan_data (id) ON DELETE CASCADE
+        )
+    """)
+
+
+def _reconcile_columns(cursor):
+    """Bring tables created by older page versions in line with the canonical layout."""
+    fan_columns = table_columns(cursor, "fan_data")
+    # The Performance Data page used to create fan_data without a model group
+    if "model_number_group" not in fan_columns:
+        cursor.execute("ALTER TABLE fan_data ADD COLUMN model_number_group TEXT NOT NULL DEFAULT ''")
+    # Stray column added by hand; curve data lives in performance_data
+    if "performance_data" in fan_columns:
+        _move_stray_points(cursor)
+        cursor.execute("ALTER TABLE fan_data DROP COLUMN performance_data")
+
+    performance_columns = table_columns(cursor, "performance_data")
+    if "curve_image" not in performance_columns:
+        cursor.execute("ALTER TABLE performance_data ADD COLUMN curve_image BLOB")
+    if "polynomial_function" not in performance_columns:
+        cursor.execute("ALTER TABLE performance_data ADD COLUMN polynomial_function TEXT")
+
+
+def _holds_points(text):
+    """Whether a stored points value has any content; anything that is not JSON counts as content."""
+    try:
+        return bool(json.loads(text))
+    except (TypeError, ValueError):
+        return bool(str(text).strip())
+
+
+def _move_stray_points(cursor):
+    """Copy points held in fan_data.performance_data into performance_data before the column goes.
+
+    Values holding no points, such as the "[]" the column was filled with,
+    are dropped. Models without a performance_data row get one holding the
+    stray text. A model whose row holds different points would lose data
+    either way, so the step refuses to run until one of the two copies is
+    removed by hand.
+    """
+    cursor.execute("""
+        SELECT f.id, f.model_number, f.performance_data, p.id, p.flow_pressure_data
+        FROM fan_data f LEFT JOIN performance_data p ON p.fan_id = f.id
+        WHERE f.performance_data IS NOT NULL
+    """)
+    orphans, conflicts = {}, set()
+    for fan_id, model_number, stray, row_id, current in cursor.fetchall():
+        if not _holds_points(stray):
+            continue
+        if row_id is None:
+            orphans[fan_id] = stray
+        elif current != stray:
+            conflicts.add(model_number)
+    if conflicts:
+        raise ValueError(
+            "fan_data.performance_data disagrees with performance_data for "
+            f"{', '.join(sorted(conflicts))}; keep one copy before migrating"
+        )
+    cursor.executemany(
+        "INSERT INTO performance_data (fan_id, flow_pressure_data) VALUES (?, ?)", orphans.items()
+    )
+
+
+def _pack_curve_points(cursor):
+    """Move curve points from JSON text into packed curve BLOBs."""
+    cursor.execute("ALTER TABLE performance_data ADD COLUMN curve_points BLOB")
+    cursor.execute("SELECT id, flow_pressure_data FROM performance_data")
+    packed = [(records_to_curve(json.loads(data or "[]")), row_id) for row_id, data in cursor.fetchall()]
+    cursor.executemany("UPDATE performance_data SET curve_points = ? WHERE id = ?", packed)
+    cursor.execute("ALTER TABLE performance_data DROP COLUMN flow_pressure_data")
+
+
+def _move_curve_images(cursor):
+    """Move inline curve_image BLOBs into the content-addressed image store."""
+    cursor.execute("ALTER TABLE performance_data ADD COLUMN curve_image_digest TEXT")
+    cursor.execute("SELECT id FROM performance_data WHERE curve_image IS NOT NULL")
+    for (row_id,) in cursor.fetchall():
+        # One BLOB at a time keeps memory flat on large tables
+        image = cursor.execute("SELECT curve_image FROM performance_data WHERE id = ?", (row_id,)).fetchone()[0]
+        cursor.execute("UPDATE performance_data SET curve_image_digest = ? WHERE id = ?", (store_image(image), row_id))
+    cursor.execute("ALTER TABLE performance_data DROP COLUMN curve_image")
+
+
+def _raw_flow_fit(fan_id, flow_rates, pressures, degree):
+    """Least-squares fit in raw flow, highest power first, as step 5 stored it; None under two points."""
+    valid = ~(np.isnan(flow_rates) | np.isnan(pressures))
+    flow_rates, pressures = flow_rates[valid], pressures[valid]
+    if len(flow_rates) < 2:
+        return None
+    degree = min(degree, len(flow_rates) - 1)
+    coefficients = np.polyfit(flow_rates, pressures, degree)
+    residual = ((pressures - np.polyval(coefficients, flow_rates)) ** 2).sum()
+    total = ((pressures - pressures.mean()) ** 2).sum()
+    return (
+        fan_id, degree, pack_coefficients(coefficients), float(1 - residual / total) if total > 0 else 1.0,
+        float(np.sqrt(residual / len(flow_rates))), float(flow_rates.min()), float(flow_rates.max()), len(flow_rates),
+    )
+
+
+def _unit_domain(flow_min, flow_max):
+    """Centre and half-width mapping a step 7 fit's flow range onto [-1, 1]."""
+    half_width = (flow_max - flow_min) / 2
+    return (flow_max + flow_min) / 2, half_width if half_width > 0 else 1.0
+
+
+def _unit_slope_rows(degree, unit_flows):
+    """Rows giving dP/dt at each normalised flow as a linear function of the coefficients."""
+    powers = np.arange(degree, -1, -1)
+    return powers * unit_flows[:, None] ** np.maximum(powers - 1, 0)
+
+
+def _unit_fit_decreasing(vander, pressures):
+    """Least-squares fit with its slope never positive on the sample grid, by a primal active-set solve."""
+    degree = vander.shape[1] - 1
+    slopes = _unit_slope_rows(degree, np.linspace(-1.0, 1.0, MIGRATION_MONOTONE_SAMPLES))
+    gram, target = vander.T @ vander, vander.T @ pressures
+    coefficients = np.zeros(degree + 1)
+    coefficients[-1] = pressures.mean()
+    working = []
+    for _ in range(MIGRATION_MONOTONE_MAX_ITERATIONS):
+        held = slopes[working]
+        kkt = np.block([[gram, held.T], [held, np.zeros((len(working), len(working)))]])
+        solution = np.linalg.lstsq(kkt, np.concatenate([target, np.zeros(len(working))]), rcond=None)[0]
+        step = solution[:degree + 1] - coefficients
+        if np.linalg.norm(step) <= 1e-10 * (1 + np.linalg.norm(coefficients)):
+            multipliers = solution[degree + 1:]
+            if not working or multipliers.min() >= 0:
+                break
+            working.pop(int(np.argmin(multipliers)))
+            continue
+        rates = slopes @ step
+        rates[working] = 0
+        with np.errstate(divide="ignore", invalid="ignore"):
+            limits = np.where(rates > 0, np.maximum(-(slopes @ coefficients), 0) / rates, np.inf)
+        blocking = int(np.argmin(limits))
+        coefficients = coefficients + min(limits[blocking], 1.0) * step
+        if limits[blocking] < 1:
+            working.append(blocking)
+    return coefficients
+
+
+def _unit_power_fit(flow_rates, pressures, degree):
+    """Fit one curve as step 7 did: decreasing, in the normalised flow, with a leave-one-out error.
+
+    Returns a dict of the curve_fits values step 7 writes, or None under two points.
+    """
+    valid = ~(np.isnan(flow_rates) | np.isnan(pressures))
+    flow_rates, pressures = flow_rates[valid], pressures[valid]
+    if len(flow_rates) < 2:
+        return None
+    degree = min(degree, len(flow_rates) - 1)
+    flow_min, flow_max = float(flow_rates.min()), float(flow_rates.max())
+    centre, half_width = _unit_domain(flow_min, flow_max)
+    vander = ((flow_rates - centre) / half_width)[:, None] ** np.arange(degree, -1, -1)
+    solver = np.linalg.pinv(vander)
+    coefficients = solver @ pressures
+
+    residuals = pressures - vander @ coefficients
+    leverage = np.einsum("pk,kp->p", vander, solver)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        loo = np.where(leverage < 1 - 1e-9, residuals / (1 - leverage), np.inf)
+    cv_rmse = float(np.sqrt((loo ** 2).mean()))
+
+    if degree > 0:
+        slopes = _unit_slope_rows(degree, np.linspace(-1.0, 1.0, MIGRATION_MONOTONE_SAMPLES)) @ coefficients
+        if (slopes > 1e-9 * np.abs(pressures).max()).any():
+            coefficients = _unit_fit_decreasing(vander, pressures)
+            residuals = pressures - vander @ coefficients
+
+    residual = (residuals ** 2).sum()
+    total = ((pressures - pressures.mean()) ** 2).sum()
+    envelope = np.polyval(coefficients, np.linspace(-1.0, 1.0, MIGRATION_ENVELOPE_SAMPLES))
+    return {
+        "degree": degree,
+        "coefficients": coefficients,
+        "r_squared": float(1 - residual / total) if total > 0 else 1.0,
+        "rmse": float(np.sqrt(residual / len(flow_rates))),
+        "cv_rmse": cv_rmse,
+        "flow_min": flow_min,
+        "flow_max": flow_max,
+        "pressure_min": float(envelope.min()),
+        "pressure_max": float(envelope.max()),
+    }
+
+
+def _unit_power_equation(fit):
+    """Format a step 7 fit as polynomial_function text: power coefficients in flow, lowest power first."""
+    centre, half_width = _unit_domain(fit["flow_min"], fit["flow_max"])
+    series = np.polynomial.Polynomial(fit["coefficients"][::-1], domain=[centre - half_width, centre + half_width])
+    return " + ".join([f"{coeff:.2f}x^{i}" for i, coeff in enumerate(series.convert().coef)])
+
+
+def _points_digest(flow_rates, pressures):
+    """SHA-256 of a curve packed as version 1 float64 "FCRV", as step 8 recorded it."""
+    flow_rates = np.ascontiguousarray(flow_rates, dtype="<f8")
+    pressures = np.ascontiguousarray(pressures, dtype="<f8")
+    header = struct.pack("<4sBBxxI", b"FCRV", 1, 1, len(flow_rates))
+    return hashlib.sha256(header + flow_rates.tobytes() + pressures.tobytes()).hexdigest()
+
+
+def _create_curve_fits(cursor):
+    """Create the curve_fits table and fit every stored curve."""
+    cursor.execute("""
+        CREATE TABLE curve_fits (
+            fan_id INTEGER PRIMARY KEY,
+            degree INTEGER NOT NULL,
+            coefficients BLOB NOT NULL,
+            r_squared REAL,
+            rmse REAL,
+            flow_min REAL,
+            flow_max REAL,
+            point_count INTEGER NOT NULL,
+            FOREIGN KEY (fan_id) REFERENCES fan_data (id) ON DELETE CASCADE
+        )
+    """)
+
+    # Keep the degree engineers chose; polynomial_function has one "x^i" term per coefficient
+    cursor.execute("SELECT fan_id, curve_points, polynomial_function FROM performance_data WHERE curve_points IS NOT NULL")
+    rows = []
+    for fan_id, blob, polynomial_function in cursor.fetchall():
+        degree = polynomial_function.count("x^") - 1 if polynomial_function else MIGRATION_FIT_DEGREE
+        rows.append(_raw_flow_fit(fan_id, *unpack_curve(blob), degree))
+
+    cursor.executemany("""
+        INSERT INTO curve_fits (fan_id, degree, coefficients, r_squared, rmse, flow_min, flow_max, point_count)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+    """, [row for row in rows if row is not None])
+
+
+def _add_pressure_envelope(cursor):
+    """Store each fit's pressure range so searches can prune on it."""
+    cursor.execute("ALTER TABLE curve_fits ADD COLUMN pressure_min REAL")
+    cursor.execute("ALTER TABLE curve_fits ADD COLUMN pressure_max REAL")
+    cursor.execute("SELECT fan_id, coefficients, flow_min, flow_max FROM curve_fits")
+    for fan_id, blob, flow_min, flow_max in cursor.fetchall():
+        # Step 5 fits are in raw flow
+        pressures = np.polyval(unpack_coefficients(blob), np.linspace(flow_min, flow_max, MIGRATION_ENVELOPE_SAMPLES))
+        cursor.execute(
+            "UPDATE curve_fits SET pressure_min = ?, pressure_max = ? WHERE fan_id = ?",
+            (float(pressures.min()), float(pressures.max()), fan_id),
+        )
+
+
+def _refit_normalised(cursor):
+    """Refit every curve on its normalised flow range and store the cross-validation error.
+
+    Stored coefficients change meaning, so they are refitted from the points
+    with each model's current degree rather than converted. The saved
+    equation is rewritten only for curves whose fitted pressures changed,
+    which happens where the new fit keeps pressure falling with flow.
+    """
+    cursor.execute("ALTER TABLE curve_fits ADD COLUMN cv_rmse REAL")
+    cursor.execute("""
+        SELECT p.fan_id, p.curve_points, f.degree, f.coefficients
+        FROM performance_data p JOIN curve_fits f ON f.fan_id = p.fan_id
+        WHERE p.curve_points IS NOT NULL
+    """)
+    fits = []
+    for fan_id, blob, degree, coefficients in cursor.fetchall():
+        fit = _unit_power_fit(*unpack_curve(blob), degree)
+        if fit is not None:
+            fit.update(fan_id=fan_id, stored_degree=degree, previous=unpack_coefficients(coefficients))
+            fits.append(fit)
+
+    cursor.executemany("""
+        UPDATE curve_fits
+        SET coefficients = ?, r_squared = ?, rmse = ?, cv_rmse = ?, pressure_min = ?, pressure_max = ?
+        WHERE fan_id = ?
+    """, [
+        (
+            pack_coefficients(fit["coefficients"]), fit["r_squared"], fit["rmse"], fit["cv_rmse"],
+            fit["pressure_min"], fit["pressure_max"], fit["fan_id"],
+        )
+        for fit in fits
+    ])
+
+    changed = []
+    for fit in fits:
+        flow_grid = np.linspace(fit["flow_min"], fit["flow_max"], MIGRATION_ENVELOPE_SAMPLES)
+        centre, half_width = _unit_domain(fit["flow_min"], fit["flow_max"])
+        old = np.polyval(fit["previous"], flow_grid)
+        difference = np.abs(np.polyval(fit["coefficients"], (flow_grid - centre) / half_width) - old).max()
+        if fit["degree"] != fit["stored_degree"] or difference > REFIT_TOLERANCE * max(np.ptp(old), 1.0):
+            changed.append(fit)
+    cursor.executemany(
+        "UPDATE performance_data SET polynomial_function = ? WHERE fan_id = ?",
+        [(_unit_power_equation(fit), fit["fan_id"]) for fit in changed],
+    )
+
+
+def _add_fit_provenance(cursor):
+    """Record each fit's basis, when it was made and a digest of the points it was made from."""
+    cursor.execute("ALTER TABLE curve_fits ADD COLUMN basis TEXT")
+    cursor.execute("ALTER TABLE curve_fits ADD COLUMN fitted_at TEXT")
+    cursor.execute("ALTER TABLE curve_fits ADD COLUMN source_digest TEXT")
+    # Every stored fit was just refitted from its current points by the previous step
+    cursor.execute(
+        "UPDATE curve_fits SET basis = ?, fitted_at = ?",
+        (MIGRATION_FIT_BASIS, datetime.now().isoformat(timespec="seconds")),
+    )
+    cursor.execute("""
+        SELECT p.fan_id, p.curve_points
+        FROM performance_data p JOIN curve_fits f ON f.fan_id = p.fan_id
+        WHERE p.curve_points IS NOT NULL
+    """)
+    cursor.executemany(
+        "UPDATE curve_fits SET source_digest = ? WHERE fan_id = ?",
+        [(_points_digest(*unpack_curve(blob)), fan_id) for fan_id, blob in cursor.fetchall()],
+    )
+
+
+def _add_catalog_version(cursor):
+    """Count writes to the cached catalog tables, so every process can tell when its caches are stale."""
+    cursor.execute("""
+        CREATE TABLE catalog_version (
+            name TEXT PRIMARY KEY,
+            version INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    for table in CATALOG_TABLES:
+        cursor.execute("INSERT INTO catalog_version (name) VALUES (?)", (table,))
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            cursor.execute(f"""
+                CREATE TRIGGER {table}_{event.lower()}_version AFTER {event} ON {table}
+                BEGIN
+                    UPDATE catalog_version SET version = version + 1 WHERE name = '{table}';
+                END
+            """)
+
+
+def _null_interpolating_cv(cursor):
+    """Store no cross-validation error, rather than infinity, for fits that interpolate their points."""
+    cursor.execute("UPDATE curve_fits SET cv_rmse = NULL WHERE cv_rmse = ?", (float("inf"),))
+
+
+def _drop_catalog_triggers(cursor):
+    """Drop the per-row counter triggers; writers now bump catalog_version once per transaction."""
+    for table in CATALOG_TABLES:
+        for event in ("INSERT", "UPDATE", "DELETE"):
+            cursor.execute(f"DROP TRIGGER IF EXISTS {table}_{event.lower()}_version")
+
+
+# Ordered (version, description, step) list; append new steps, never edit applied ones
+MIGRATIONS = [
+    (1, "Create base tables", _create_base_tables),
+    (2, "Reconcile fan_data and performance_data columns", _reconcile_columns),
+    (3, "Store curve points as packed arrays", _pack_curve_points),
+    (4, "Move curve images to the image store", _move_curve_images),
+    (5, "Add fitted curve coefficients", _create_curve_fits),
+    (6, "Add fitted pressure envelope", _add_pressure_envelope),
+    (7, "Refit curves in a normalised flow domain", _refit_normalised),
+    (8, "Add fit basis, time and source digest", _add_fit_provenance),
+    (9, "Add catalog write counters", _add_catalog_version),
+    (10, "Clear infinite cross-validation errors", _null_interpolating_cv),
+    (11, "Count catalog writes per transaction instead of per row", _drop_catalog_triggers),
+]
+
+
+# =============================================================================#
+# Migration runner
+
+def table_columns(cursor, table):
+    """Return the column names of a table."""
+    cursor.execute(f"PRAGMA table_info({table})")
+    return [row[1] for row in cursor.fetchall()]
+
+
+def get_schema_version(cursor):
+    """Return the highest applied migration version, or 0 for a fresh database."""
+    cursor.execute("""
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            description TEXT NOT NULL,
+            applied_at TEXT NOT NULL
+        )
+    """)
+    cursor.execute("SELECT MAX(version) FROM schema_version")
+    return cursor.fetchone()[0] or 0
+
+
+def migrate():
+    """Apply every pending migration, one transaction per step."""
+    applied = []
+    for version, description, step in MIGRATIONS:
+        # BEGIN IMMEDIATE serialises concurrent processes; re-check the version inside it
+        with get_connection(write=True) as conn:
+            cursor = conn.cursor()
+            if get_schema_version(cursor) >= version:
+                continue
+            step(cursor)
+            cursor.execute(
+                "INSERT INTO schema_version (version, description, applied_at) VALUES (?, ?, ?)",
+                (version, description, datetime.now().isoformat(timespec="seconds")),
+            )
+        applied.append(version)
+    return applied
+
+
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+
+def ensure_schema():
+    """Run migrations once per process; later calls return immediately."""
+    global _schema_ready
+    if _schema_ready:
+        return
+    with _schema_lock:
+        if not _schema_ready:
+            migrate()
+            _schema_ready = True
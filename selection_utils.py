@@ -0,0 +1,131 @@
+import numpy as np
+
+from affinity_utils import scale_fit_index, solve_speed_ratios
+from fit_utils import index_evaluator, load_fit_index
+
+
+# Default allowed pressure shortfall below the duty point, as a fraction of the duty pressure
+PRESSURE_TOLERANCE = 0.05
+
+# Default allowed pressure excess above the duty point, as a fraction of the duty pressure
+MAX_OVERSIZE = 0.25
+
+
+def candidate_mask(index, flow_rate, pressure_low, pressure_high, flow_tolerance=0.0, brand=None,
+                   drive_train=None):
+    """Prune the fit index to curves whose flow range and pressure envelope can reach the duty point."""
+    flow_margin = flow_rate * flow_tolerance
+    mask = (
+        (index["flow_min"] <= flow_rate + flow_margin)
+        & (index["flow_max"] >= flow_rate - flow_margin)
+        & (index["pressure_max"] >= pressure_low)
+        & (index["pressure_min"] <= pressure_high)
+    )
+    if brand:
+        mask &= index["brand"] == brand
+    if drive_train:
+        mask &= index["drive_train"] == drive_train
+    return mask
+
+
+def select_fans(flow_rate, pressure, pressure_tolerance=PRESSURE_TOLERANCE, max_oversize=MAX_OVERSIZE,
+                flow_tolerance=0.0, brand=None, drive_train=None, speed=None, limit=None):
+    """Find every model whose fitted curve passes through a duty point.
+
+    A model qualifies when the duty flow lies within its fitted flow range
+    (widened by ``flow_tolerance`` as a fraction of the duty flow) and its
+    fitted pressure at that flow is between ``pressure * (1 - pressure_tolerance)``
+    and ``pressure * (1 + max_oversize)``. Results are ranked by the absolute
+    pressure margin, closest match first.
+
+    When ``speed`` (rpm) is given every curve is first moved to that speed
+    with the fan affinity laws; models without a numeric speed are skipped.
+    """
+    index = load_fit_index()
+    if speed:
+        index = scale_fit_index(index, speed / index["speed_rpm"])
+    pressure_low = pressure * (1 - pressure_tolerance)
+    pressure_high = pressure * (1 + max_oversize)
+
+    # Envelope pruning first, then evaluate only the surviving polynomials
+    survivors = np.flatnonzero(
+        candidate_mask(index, flow_rate, pressure_low, pressure_high, flow_tolerance, brand, drive_train)
+    )
+    if not len(survivors):
+        return []
+
+    duty_flow = np.clip(flow_rate, index["flow_min"][survivors], index["flow_max"][survivors])
+    duty_pressure = index_evaluator(index, survivors)(duty_flow[:, None])[:, 0]
+    matched = (duty_pressure >= pressure_low) & (duty_pressure <= pressure_high)
+    survivors, duty_pressure = survivors[matched], duty_pressure[matched]
+
+    margin = (duty_pressure - pressure) / pressure
+    order = np.argsort(np.abs(margin), kind="stable")
+    if limit:
+        order = order[:limit]
+
+    return [
+        {
+            "fan_id": int(index["fan_id"][i]),
+            "model_number": index["model_number"][i],
+            "brand": index["brand"][i],
+            "drive_train": index["drive_train"][i],
+            "speed": float(speed or index["speed_rpm"][i]),
+            "pressure_at_duty": float(p),
+            "margin": float(m),
+        }
+        for i, p, m in zip(survivors[order], duty_pressure[order], margin[order])
+    ]
+
+
+def select_speed_fans(flow_rate, pressure, min_speed, max_speed, brand=None, drive_train=None, limit=None):
+    """Find models that meet a duty point exactly at some speed between min_speed and max_speed.
+
+    Intended for belt-driven fans, whose speed can be set freely. Each curve is
+    scaled with the fan affinity laws and the required speed solved for all
+    candidates at once. Results are ranked by how far the required speed is
+    from the tested speed, since the scaled curve is most reliable close to it.
+    """
+    index = load_fit_index()
+    speed_rpm = index["speed_rpm"]
+
+    # Envelope pruning across the whole speed range: flow scales with r and pressure with r**2
+    with np.errstate(invalid="ignore", divide="ignore"):
+        ratio_min = min_speed / speed_rpm
+        ratio_max = max_speed / speed_rpm
+    mask = (
+        (index["flow_max"] * ratio_max >= flow_rate)
+        & (index["flow_min"] * ratio_min <= flow_rate)
+        & (index["pressure_max"] * ratio_max ** 2 >= pressure)
+        & (index["pressure_min"] * ratio_min ** 2 <= pressure)
+    )
+    if brand:
+        mask &= index["brand"] == brand
+    if drive_train:
+        mask &= index["drive_train"] == drive_train
+    survivors = np.flatnonzero(mask)
+    if not len(survivors):
+        return []
+
+    ratios = solve_speed_ratios(
+        index["coefficients"][survivors], index["flow_min"][survivors], index["flow_max"][survivors],
+        flow_rate, pressure, ratio_min[survivors], ratio_max[survivors],
+    )
+    solved = ~np.isnan(ratios)
+    survivors, ratios = survivors[solved], ratios[solved]
+
+    order = np.argsort(np.abs(np.log(ratios)), kind="stable")
+    if limit:
+        order = order[:limit]
+
+    return [
+        {
+            "fan_id": int(index["fan_id"][i]),
+            "model_number": index["model_number"][i],
+            "brand": index["brand"][i],
+            "drive_train": index["drive_train"][i],
+            "tested_speed": float(speed_rpm[i]),
+            "required_speed": float(speed_rpm[i] * r),
+        }
+        for i, r in zip(survivors[order], ratios[order])
+    ]
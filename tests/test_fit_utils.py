@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from fit_utils import MAX_FIT_DEGREE, fit_curve, fit_evaluator, fit_stacked
+
+
+@pytest.mark.parametrize("degree", [1, 2, 3, 5])
+def test_cv_rmse_matches_explicit_leave_one_out(degree):
+    rng = np.random.default_rng(degree)
+    flow_rates = np.sort(rng.uniform(0.0, 5.0, (6, 12)), axis=1)
+    pressures = 400 - 30 * flow_rates - 4 * flow_rates ** 2 + rng.normal(0, 5, flow_rates.shape)
+
+    _, _, _, cv_rmse = fit_stacked(flow_rates, pressures, degree, decreasing=False)
+
+    for curve, (curve_flows, curve_pressures) in enumerate(zip(flow_rates, pressures)):
+        errors = []
+        for left_out in range(len(curve_flows)):
+            kept = np.arange(len(curve_flows)) != left_out
+            coefficients = np.polyfit(curve_flows[kept], curve_pressures[kept], degree)
+            errors.append(curve_pressures[left_out] - np.polyval(coefficients, curve_flows[left_out]))
+        assert cv_rmse[curve] == pytest.approx(np.sqrt(np.mean(np.square(errors))), rel=1e-6)
+
+
+def test_interpolating_fit_has_no_cv_rmse():
+    fit = fit_curve(np.array([0.0, 1.0, 2.0]), np.array([50.0, 40.0, 20.0]), degree=2)
+    assert fit["cv_rmse"] is None
+
+
+@pytest.mark.parametrize("seed", range(20))
+def test_decreasing_fit_never_rises(seed):
+    rng = np.random.default_rng(seed)
+    points = int(rng.integers(6, 16))
+    flow_rates = np.sort(rng.uniform(0.0, 10.0, points))
+    # A falling curve with bumps an unconstrained fit would follow upwards
+    pressures = 100 - 3 * flow_rates + 10 * np.sin(flow_rates * rng.uniform(0.5, 2.0)) + rng.normal(0, 5, points)
+
+    for degree in range(1, min(MAX_FIT_DEGREE, points - 1) + 1):
+        fit = fit_curve(flow_rates, pressures, degree, decreasing=True)
+        fitted = fit_evaluator(fit)(np.linspace(fit["flow_min"], fit["flow_max"], 2001))
+        assert np.diff(fitted).max() <= 1e-9 * np.abs(pressures).max()